@@ -5,6 +5,7 @@ Model Checker Collection for the Model Checking Contest.
 """
 
 import argparse
+import contextlib
 import hashlib
 import math
 import logging
@@ -16,17 +17,27 @@ import json
 import pathlib
 import pickle
 import platform
+import queue
 import re
+import shutil
 import sys
 import tempfile
 import tarfile
-import pandas
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 import xmltodict
-import docker
 
-from mcc4mcc.analysis import known, learned, score_of, max_score, \
-    characteristics_of, REMOVE
+# Modules that import pandas or scikit-learn are imported within commands,
+# to keep the run command fast to start.
+from mcc4mcc.archives import ModelCache
+from mcc4mcc.artifacts import Artifacts, Known, write_known
+from mcc4mcc.formulas import formulas_of, result_of, restrict, answered, \
+    UNANSWERED
 from mcc4mcc.model import Values, Data, value_of, CHARACTERISTICS
+from mcc4mcc.scheduler import Scheduler
+from mcc4mcc.selector import Selector
+from mcc4mcc.telemetry import ResultsLog, Telemetry, bytes_of
 
 VERDICTS = {
     "ORDINARY": "Ordinary",
@@ -61,18 +72,27 @@ RENAMING = {
 
 TEMPORARY = None
 
+# Start of the process, from which the time budget of run is counted:
+STARTED = time.monotonic()
 
-def unarchive(filename):
+
+def unarchive(filename, temporary=None, cache=None):
     """
-    Extract the model from an archive.
+    Extract the model from an archive,
+    into the cache of models or the given temporary directory if any.
     """
     # pylint: disable=global-statement
     global TEMPORARY
     # pylint: enable=global-statement
     while True:
-        if os.path.isfile(filename):
-            directory = tempfile.TemporaryDirectory()
-            TEMPORARY = directory
+        if os.path.isfile(filename) and cache is not None:
+            filename = cache.extract(filename)
+        elif os.path.isfile(filename):
+            if temporary is None:
+                directory = tempfile.TemporaryDirectory()
+                TEMPORARY = directory
+            else:
+                directory = temporary
             logging.info(
                 f"Extracting archive {filename} "
                 f"to temporary directory {directory.name}.")
@@ -112,10 +132,68 @@ def read_boolean(filename):
         return value_of(what)
 
 
+def updated_artifact(artifacts, name, compute, changed, removed):
+    """
+    Loads a JSON artifact with an entry for each examination,
+    and recomputes only the entries of the changed examinations.
+    compute(None) returns the entries for all examinations,
+    and compute(changed) for the changed ones only.
+    """
+    if not artifacts.valid(name):
+        result = compute(None)
+    elif changed or removed:
+        result = merged_scores(
+            artifacts.load_json(name), compute(changed), removed,
+        )
+    else:
+        return artifacts.load_json(name)
+    artifacts.dump_json(name, result)
+    return result
+
+
+def merged_scores(previous, current, removed):
+    """
+    Updates the entries of each examination in previous with current,
+    and removes the entries of the removed examinations.
+    """
+    result = dict(previous)
+    result.update(current)
+    for examination in removed:
+        result.pop(examination, None)
+    return result
+
+
+def tool_score(data, tool, options, total_score):
+    """
+    Computes the score of a tool, for each examination.
+    """
+    # pylint: disable=import-outside-toplevel
+    from mcc4mcc.analysis import score_of
+    # pylint: enable=import-outside-toplevel
+    logging.info(f"Computing score of tool: {tool}.")
+    score = score_of(data, tool, options)
+    subresult = {
+        "Algorithm": tool,
+        "Is-Tool": True,
+        "Is-Algorithm": False,
+    }
+    total = 0
+    for key, value in score.items():
+        subresult[key] = value
+        total = total + value
+    ratio = math.ceil(100*total/total_score)
+    logging.info(f"  Score: {total} / {total_score} ({ratio}%)")
+    return subresult
+
+
 def do_extract(arguments):
     """
     Main function for the extract command.
     """
+    # pylint: disable=import-outside-toplevel
+    from mcc4mcc.analysis import known, learned, max_score, \
+        characteristics_of, algorithms_of, selector_of, digests_of
+    # pylint: enable=import-outside-toplevel
     if arguments.exclude is None:
         arguments.exclude = []
     else:
@@ -124,21 +202,31 @@ def do_extract(arguments):
         arguments.forget = []
     else:
         arguments.forget = sorted(arguments.forget.split(","))
+    # Load data:
+    data = Data({
+        "characteristics": arguments.characteristics,
+        "results": arguments.results,
+        "renaming": RENAMING,
+        "exclude": arguments.exclude,
+        "year": arguments.year,
+        "columnar": arguments.columnar,
+        "parsed": arguments.parsed_cache,
+    })
     # Compute prefix for generated files:
-    hasher = hashlib.md5()
-    with open(arguments.characteristics, "rb") as hinput:
-        hasher.update(hinput.read())
-    characteristics_hash = hasher.hexdigest()
-    hasher = hashlib.md5()
-    with open(arguments.results, "rb") as hinput:
-        hasher.update(hinput.read())
-    results_hash = hasher.hexdigest()
+    characteristics_hash = data.checksums()["characteristics"]
+    if arguments.incremental:
+        # Artifacts are updated in place when results change:
+        results_hash = [os.path.realpath(x) for x in arguments.results]
+    else:
+        results_hash = data.checksums()["results"]
     as_json = json.dumps({
         "characteristics": characteristics_hash,
         "results": results_hash,
         "duplicates": arguments.duplicates,
         "exclude": arguments.exclude,
         "forget": arguments.forget,
+        "score": arguments.score,
+        "seed": arguments.seed,
         "training": arguments.training,
         "year": arguments.year,
     }, sort_keys=True)
@@ -148,14 +236,6 @@ def do_extract(arguments):
     logging.info(f"Prefix is {prefix}.")
     with open(f"{arguments.data}/{prefix}-configuration.json", "w") as output:
         output.write(as_json)
-    # Load data:
-    data = Data({
-        "characteristics": arguments.characteristics,
-        "results": arguments.results,
-        "renaming": RENAMING,
-        "exclude": arguments.exclude,
-        "year": arguments.year,
-    })
     options = {
         "Choice": True,
         "Duplicates": arguments.duplicates,
@@ -165,6 +245,9 @@ def do_extract(arguments):
         "Forget": arguments.forget,
         "Training": arguments.training,
         "Score": arguments.score,
+        "Jobs": arguments.jobs,
+        "Seed": arguments.seed,
+        "Top": arguments.top,
     }
     # Read data:
     data.characteristics()
@@ -174,8 +257,28 @@ def do_extract(arguments):
     data.results()
     examinations = {x["Examination"] for x in data.results()}
     tools = {x["Tool"] for x in data.results()}
+    # Reuse artifacts already computed for this prefix,
+    # and update them only for the examinations whose results have changed:
+    artifacts = Artifacts(arguments.data, prefix)
+    digests = digests_of(data)
+    previous = {}
+    if artifacts.valid("digests.json"):
+        previous = artifacts.load_json("digests.json")
+    changed = sorted(
+        examination for examination, digest in digests.items()
+        if previous.get(examination) != digest
+    )
+    removed = sorted(x for x in previous if x not in digests)
+    if previous and (changed or removed):
+        logging.info(f"Results have changed for {', '.join(changed)}.")
+    update = dict(options)
+    update["Examinations"] = changed
     # Compute maximum score:
-    maxs = max_score(data, options)
+    maxs = updated_artifact(
+        artifacts, "max-score.json",
+        lambda x: max_score(data, options if x is None else update),
+        changed, removed,
+    )
     total_score = 0
     for _, subscore in maxs.items():
         total_score += subscore
@@ -184,31 +287,74 @@ def do_extract(arguments):
         score = maxs[examination]
         logging.info(f"* {examination}: {score}")
     # Extract known data:
-    known_data = known(data)
-    with open(f"{arguments.data}/{prefix}-known.json", "w") as output:
-        json.dump(known_data, output)
-    # Extract learned data:
-    learned_data, values = learned(data, options)
-    with open(f"{arguments.data}/{prefix}-values.json", "w") as output:
-        json.dump(values.items, output)
+    known_valid = artifacts.valid("known.json")
+    known_data = updated_artifact(
+        artifacts, "known.json",
+        lambda x: known(data, None if x is None else update),
+        changed, removed,
+    )
+    if not known_valid or changed or removed \
+            or not artifacts.valid("known.sqlite"):
+        write_known(artifacts.path("known.sqlite"), known_data)
+        artifacts.store("known.sqlite")
+    # Extract learned data, for algorithms that are not already stored,
+    # and update the scores of the others if results have changed:
+    stored = {}
+    for name in algorithms_of():
+        if artifacts.valid(f"learned.{name}.json") \
+                and artifacts.valid(f"learned.{name}.p") \
+                and artifacts.valid("features.json") \
+                and artifacts.valid("values.p"):
+            stored[name] = artifacts.load_json(f"learned.{name}.json")
+    missing = [
+        name for name in algorithms_of()
+        if name not in stored or changed or removed
+    ]
+    learned_data = [x for name, x in stored.items() if name not in missing]
+    if artifacts.valid("values.p") and artifacts.valid("values.json"):
+        options["Values"] = Values(artifacts.load_pickle("values.p"))
+    if missing:
+        update["Algorithms"] = missing
+        update["Trained"] = {
+            name: entry.get("Digest")
+            for name, entry in stored.items()
+        }
+        if "Values" in options:
+            update["Values"] = options["Values"]
+        subresults, values = learned(data, update)
+        artifacts.store("features.json")
+        artifacts.store("encoder.json")
+        artifacts.dump_pickle("values.p", values.items)
+        artifacts.dump_json("values.json", values.items)
+        for subresult in subresults:
+            name = subresult["Algorithm"]
+            if stored.get(name, {}).get("Digest") != subresult["Digest"]:
+                artifacts.store(f"learned.{name}.p")
+            if name in stored:
+                subresult = merged_scores(stored[name], subresult, removed)
+            artifacts.dump_json(f"learned.{name}.json", subresult)
+            learned_data.append(subresult)
+        learned_data = sorted(learned_data, key=lambda e: e["Algorithm"])
     # Compute scores for tools:
     for tool in sorted(tools):
-        logging.info(f"Computing score of tool: {tool}.")
-        score = score_of(data, tool, options)
-        subresult = {
-            "Algorithm": tool,
-            "Is-Tool": True,
-            "Is-Algorithm": False,
-        }
-        total = 0
-        for key, value in score.items():
-            subresult[key] = value
-            total = total + value
+        subresult = updated_artifact(
+            artifacts, f"score.{tool}.json",
+            lambda x, tool=tool: tool_score(
+                data, tool, options if x is None else update, total_score,
+            ),
+            changed, removed,
+        )
         learned_data.append(subresult)
-        ratio = math.ceil(100*total/total_score)
-        logging.info(f"  Score: {total} / {total_score} ({ratio}%)")
-    with open(f"{arguments.data}/{prefix}-learned.json", "w") as output:
-        json.dump(learned_data, output)
+    artifacts.dump_json("learned.json", learned_data)
+    artifacts.dump_json("digests.json", digests)
+    # Compile a selector bundle, for a fast run command:
+    if missing or not artifacts.valid("selector.json"):
+        if not missing:
+            values = options["Values"]
+        artifacts.dump_json("selector.json", selector_of(
+            data, learned_data, values,
+            artifacts.load_json("features.json"), options,
+        ))
     # Print per-examination scores:
     srt = []
     for subresult in learned_data:
@@ -233,35 +379,368 @@ def do_extract(arguments):
                              f"for {name}.")
 
 
-def do_run(arguments):
+def cache_of(arguments):
     """
-    Main function for the run command.
+    Returns the cache of extracted models, or None if it is disabled.
     """
-    logging.info(f"Prefix is {arguments.prefix}.")
-    # Load known info:
+    if arguments.cache is None:
+        return None
+    return ModelCache(arguments.cache, arguments.cache_size * 2**20)
+
+
+def pool_of(arguments, client, cache, persistent):
+    """
+    Returns the pool of tool containers, or None if it is disabled.
+    """
+    if arguments.pool is None:
+        return None
+    # pylint: disable=import-outside-toplevel
+    from mcc4mcc.pool import ContainerPool
+    # pylint: enable=import-outside-toplevel
+    mounts = [] if cache is None else [cache.directory]
+    return ContainerPool(client, arguments.pool, mounts, persistent)
+
+
+def results_log_of(arguments, cores):
+    """
+    Returns the local log of tool runs, or None if it is disabled.
+    """
+    if arguments.results_log is None:
+        return None
+    return ResultsLog(
+        arguments.results_log, cores, bytes_of(arguments.memory),
+    )
+
+
+def limits_of(arguments):
+    """
+    Computes the resource limits of each tool container.
+    """
+    limits = {}
+    if arguments.cpus is not None:
+        limits["nano_cpus"] = int(arguments.cpus * 1e9)
+    if arguments.memory is not None:
+        limits["mem_limit"] = arguments.memory
+    return limits
+
+
+def volumes_of(path, scratch=None):
+    """
+    Computes the volumes of a tool container.
+    Without scratch directory, the model in path is mounted read-write.
+    Otherwise, the scratch directory is mounted read-write,
+    and each file of the model is mounted read-only within it.
+    """
+    if scratch is None:
+        return {
+            f"{path}": {
+                "bind": "/mcc-data",
+                "mode": "rw",
+            },
+        }
+    result = {
+        f"{scratch}": {
+            "bind": "/mcc-data",
+            "mode": "rw",
+        },
+    }
+    for name in os.listdir(path):
+        result[f"{path}/{name}"] = {
+            "bind": f"/mcc-data/{name}",
+            "mode": "ro",
+        }
+    return result
+
+
+class RunContext:
+    """
+    Resources shared by the tool runs of a command:
+    the docker client, and the cache of models, the pool of containers
+    and the log of tool runs if they are enabled.
+    """
+    def __init__(self, client, cache=None, pool=None, log=None):
+        self.client = client
+        self.cache = cache
+        self.pool = pool
+        self.log = log
+
+
+def start_tool(context, run):
+    """
+    Starts the container of a tool on the model in path,
+    with a time confinement in seconds,
+    or runs the tool in a container of the pool if any.
+    The run gives the tool, examination, instance, path, limits,
+    confinement and scratch directory (or None).
+    """
+    tool = run["Tool"]
+    if context.pool is not None:
+        return context.pool.run(run)
+    return context.client.containers.run(
+        image=f"mccpetrinets/{tool.lower()}",
+        command="mcc-head",
+        auto_remove=False,
+        stdout=True,
+        stderr=True,
+        detach=True,
+        working_dir="/mcc-data",
+        volumes=volumes_of(run["Path"], run["Scratch"]),
+        environment={
+            "BK_LOG_FILE": "/mcc-data/log",
+            "BK_EXAMINATION": f"{run['Examination']}",
+            "BK_TIME_CONFINEMENT": f"{run['Confinement']}",
+            "BK_INPUT": f"{run['Instance']}",
+            "BK_TOOL": tool.lower(),
+        },
+        **run["Limits"],
+    )
+
+
+def stop_tool(container):
+    """
+    Kills the container of a tool, if it is still running.
+    """
+    # pylint: disable=import-outside-toplevel
+    import docker
+    # pylint: enable=import-outside-toplevel
+    try:
+        container.kill()
+    except docker.errors.APIError:
+        pass
+
+
+def remove_tool(container):
+    """
+    Removes the container of a tool, killing it if it is still running.
+    """
+    # pylint: disable=import-outside-toplevel
+    import docker
+    # pylint: enable=import-outside-toplevel
+    try:
+        container.remove(force=True)
+    except docker.errors.APIError:
+        pass
+
+
+def wait_tool(finished, tool, container):
+    """
+    Waits for the end of a tool, and puts its result in the finished queue.
+    The container may be removed meanwhile, the tool has then failed.
+    """
+    # pylint: disable=import-outside-toplevel
+    import docker
+    # pylint: enable=import-outside-toplevel
+    try:
+        result = container.wait()
+    except (docker.errors.APIError, OSError):
+        result = {"StatusCode": None}
+    finished.put((tool, result))
+
+
+def succeeded(result, lines, formulas):
+    """
+    Tells if a tool run has succeeded: the tool has exited normally,
+    and has answered all formulas, or at least one measure
+    if the examination has no formula.
+    """
+    if result["StatusCode"] != 0:
+        return False
+    answers = answered(lines)
+    if formulas is None:
+        return bool(answers)
+    return all(x in answers for x in formulas)
+
+
+def run_portfolio(context, run, tools):
+    """
+    Runs tools concurrently, each one on its own copy of the model,
+    or on its own scratch directory if the model is in the cache.
+    The tools that terminate are recorded in the log if any.
+    Returns the first tool that succeeds, or None if all tools fail.
+    Tools are killed at the end of the time confinement of the run,
+    and the other containers as soon as a tool succeeds.
+    """
+    # pylint: disable=import-outside-toplevel
+    import docker
+    # pylint: enable=import-outside-toplevel
+    examination = run["Examination"]
+    instance = run["Instance"]
+    formulas = formulas_of(run["Path"], examination)
+    finished = queue.Queue()
+    runs = {}
+    containers = {}
+    telemetries = {}
+    with contextlib.ExitStack() as stack:
+        for tool in tools:
+            logging.info(f"{examination} {tool} {instance} (portfolio)...")
+            directory = stack.enter_context(tempfile.TemporaryDirectory())
+            tool_run = dict(run, Tool=tool)
+            if context.cache is not None:
+                # The cached model is read-only, the tool writes in a scratch:
+                tool_run["Scratch"] = os.path.realpath(directory)
+            else:
+                tool_run["Path"] = os.path.realpath(directory) + "/model"
+                shutil.copytree(run["Path"], tool_run["Path"])
+            try:
+                container = start_tool(context, tool_run)
+            except docker.errors.NotFound:
+                logging.warning(f"Docker image for {tool} does not exist.")
+                continue
+            stack.callback(remove_tool, container)
+            runs[tool] = tool_run
+            containers[tool] = container
+            telemetries[tool] = Telemetry(container, context.pool is not None)
+            stack.callback(telemetries[tool].done.set)
+            # Kill the tool if it does not respect its time confinement:
+            timer = threading.Timer(
+                run["Confinement"], stop_tool, args=(container,),
+            )
+            timer.start()
+            stack.callback(timer.cancel)
+            threading.Thread(
+                target=wait_tool,
+                args=(finished, tool, container),
+                daemon=True,
+            ).start()
+        for _ in containers:
+            tool, result = finished.get()
+            measures = telemetries[tool].stop()
+            lines = [
+                line.decode("UTF-8").strip()
+                for line in containers[tool].logs().splitlines()
+            ]
+            if context.log is not None:
+                context.log.append(runs[tool], lines, result, measures)
+            if succeeded(result, lines, formulas):
+                logging.info(f"Tool {tool} succeeded.")
+                for line in lines:
+                    logging.info(line)
+                return tool
+            logging.warning(f"Tool {tool} failed.")
+        return None
+
+
+def known_of(known_data, examination, key):
+    """
+    Returns known data for an examination and an instance or model,
+    from either the SQLite known data or the JSON one.
+    """
+    if isinstance(known_data, Known):
+        return known_data.get(examination, key)
+    if examination in known_data:
+        return known_data[examination].get(key)
+    return None
+
+
+def learned_ranking(arguments, algorithm, characteristics, selector):
+    """
+    Ranks tools using a pickled learned algorithm.
+    This is the slow path, as it requires pandas and scikit-learn.
+    """
+    # pylint: disable=import-outside-toplevel
+    import pandas
+    from mcc4mcc.algorithms import ranking_of
+    from mcc4mcc.encoder import encoder_of
+    # pylint: enable=import-outside-toplevel
+    filename = f"{arguments.data}/{arguments.prefix}-learned.{algorithm}.p"
+    with open(filename, "rb") as i:
+        model = pickle.load(i)
+    priors = {}
+    if selector is not None:
+        priors = selector.prior(characteristics["Examination"])
+    filename = f"{arguments.data}/{arguments.prefix}-encoder.json"
+    if os.path.isfile(filename):
+        logging.info(f"Reading features encoder in {filename}.")
+        with open(filename, "r") as i:
+            encoder = encoder_of(json.load(i))
+        values = encoder.values_
+        dataframe = encoder.transform(pandas.DataFrame([characteristics]))
+    elif selector is None:
+        # Load translations:
+        logging.info(
+            f"Reading value translations "
+            f"in {arguments.data}/{arguments.prefix}-values.json."
+        )
+        with open(f"{arguments.data}/{arguments.prefix}-values.json",
+                  "r") as i:
+            translations = json.load(i)
+        values = Values(translations)
+        # Load characteristics for machine learning:
+        test = {}
+        for key, value in characteristics.items():
+            test[key] = values.to_learning(value)
+        dataframe = pandas.DataFrame([test])
+    else:
+        values = selector.values
+        dataframe = pandas.DataFrame(
+            [selector.vector(characteristics)],
+            columns=selector.features,
+        )
+    # http://scikit-learn.org/stable/modules/model_persistence.html
+    ranking = ranking_of(model, dataframe, [priors])[0]
+    return [
+        (values.from_learning(tool), float(probability))
+        for tool, probability in ranking
+    ]
+
+
+def learned_tools_of(arguments, algorithm, characteristics, selector):
+    """
+    Ranks the tools from the selector bundle if possible,
+    or using the learned algorithm otherwise,
+    and keeps the top ones to run them one after the other.
+    """
+    ranking = None
+    if selector is not None:
+        ranking = selector.rank(algorithm, characteristics)
+    if ranking is None:
+        ranking = learned_ranking(
+            arguments, algorithm, characteristics, selector,
+        )
+    return [
+        {"Tool": tool, "Confidence": confidence}
+        for tool, confidence in ranking[:max(1, arguments.top)]
+    ]
+
+
+def log_distance(known_tools, found):
+    """
+    Logs how far the learned tool is from the best known tool.
+    """
+    best = known_tools[0]
+    for entry in known_tools:
+        if entry["Tool"] == found["Tool"]:
+            distance = entry["Time"] / best["Time"]
+            logging.info(f"Learned tool {entry['Tool']} is {distance}x "
+                         f"far from the best tool {best['Tool']}.")
+            break
+
+
+def known_data_of(arguments):
+    """
+    Loads known data, from SQLite if available or else from JSON.
+    """
+    filename = f"{arguments.data}/{arguments.prefix}-known.sqlite"
+    if os.path.isfile(filename):
+        logging.info(f"Using known information in {filename}.")
+        return Known(filename)
     logging.info(
         f"Reading known information "
         f"in {arguments.data}/{arguments.prefix}-known.json."
     )
     with open(f"{arguments.data}/{arguments.prefix}-known.json", "r") as i:
-        known_data = json.load(i)
-    # Load learned info:
-    logging.info(
-        f"Reading learned information "
-        f"in {arguments.data}/{arguments.prefix}-learned.json."
-    )
-    with open(f"{arguments.data}/{arguments.prefix}-learned.json", "r") as i:
-        learned_data = json.load(i)
-    # Load translations:
-    logging.info(
-        f"Reading value translations "
-        f"in {arguments.data}/{arguments.prefix}-values.json."
-    )
-    with open(f"{arguments.data}/{arguments.prefix}-values.json", "r") as i:
-        translations = json.load(i)
-    values = Values(translations)
+        return json.load(i)
+
+
+def do_run(arguments):
+    """
+    Main function for the run command.
+    """
+    logging.info(f"Prefix is {arguments.prefix}.")
+    known_data = known_data_of(arguments)
     # Find input:
-    directory = unarchive(arguments.input)
+    cache = cache_of(arguments)
+    directory = unarchive(arguments.input, cache=cache)
     if directory is None:
         sys.exit(1)
     if arguments.instance is None:
@@ -281,12 +760,10 @@ def do_run(arguments):
             "Memory": None,
         }]
     else:
-        # Find known tools:
-        if arguments.examination not in known_data:
-            if instance not in known_data[arguments.examination]:
-                known_tools = known_data[arguments.examination][instance]
-            elif model not in known_data[arguments.examination]:
-                known_tools = known_data[arguments.examination][model]
+        # Find known tools, for the instance or else for the model:
+        known_tools = known_of(known_data, arguments.examination, instance) \
+            or known_of(known_data, arguments.examination, model) \
+            or None
     if known_tools is None:
         logging.warning(
             f"Cannot find known information "
@@ -294,25 +771,28 @@ def do_run(arguments):
             f"on instance {instance} or model {model}.")
     # Set algorithm:
     learned_tools = None
+    selector = None
+    filename = f"{arguments.data}/{arguments.prefix}-selector.json"
+    if os.path.isfile(filename):
+        logging.info(f"Reading selector in {filename}.")
+        selector = Selector(filename)
     if arguments.algorithm:
-        algorithm = sorted(
-            [x for x in learned_data
-             if x["Algorithm"] == arguments.algorithm],
-            key=lambda e: e[arguments.examination],
-            reverse=True,
-        )[0]["Algorithm"]
-        filename = f"{arguments.data}/{arguments.prefix}-learned.{algorithm}.p"
-        with open(filename, "rb") as i:
-            model = pickle.load(i)
+        algorithm = arguments.algorithm
+    elif selector is not None:
+        algorithm = selector.algorithm(arguments.examination)
     else:
+        logging.info(
+            f"Reading learned information "
+            f"in {arguments.data}/{arguments.prefix}-learned.json."
+        )
+        with open(f"{arguments.data}/{arguments.prefix}-learned.json",
+                  "r") as i:
+            learned_data = json.load(i)
         algorithm = sorted(
             [x for x in learned_data if x["Is-Algorithm"]],
             key=lambda e: e[arguments.examination],
             reverse=True,
         )[0]["Algorithm"]
-        filename = f"{arguments.data}/{arguments.prefix}-learned.{algorithm}.p"
-        with open(filename, "rb") as i:
-            model = pickle.load(i)
     logging.info(f"Using algorithm or tool {algorithm}.")
     # Find learned tools:
     is_colored = read_boolean(f"{directory}/iscolored")
@@ -337,29 +817,15 @@ def do_run(arguments):
         else:
             characteristics[VERDICTS[value["@reference"]]] = None
     logging.info(f"Model characteristics are: {characteristics}.")
-    # Load characteristics for machine learning:
-    test = {}
-    for key, value in characteristics.items():
-        test[key] = values.to_learning(value)
-    # http://scikit-learn.org/stable/modules/model_persistence.html
-    predicted = model.predict(pandas.DataFrame([test]))
-    learned_tools = [{"Tool": values.from_learning(predicted[0])}]
+    learned_tools = learned_tools_of(
+        arguments, algorithm, characteristics, selector,
+    )
     logging.info(f"Known tools are: {known_tools}.")
     logging.info(f"Learned tools are: {learned_tools}.")
     # Evaluate quality of learned tool:
     if known_tools is not None and learned_tools is not None:
-        found = learned_tools[0]
-        best = known_tools[0]
         if arguments.tool is None:
-            distance = None
-            for entry in known_tools:
-                if entry["Tool"] == found["Tool"]:
-                    found_tool = entry["Tool"]
-                    best_tool = best["Tool"]
-                    distance = entry["Time"] / best["Time"]
-                    logging.info(f"Learned tool {found_tool} is {distance}x "
-                                 f"far from the best tool {best_tool}.")
-                    break
+            log_distance(known_tools, learned_tools[0])
     elif known_tools is None:
         logging.warning(f"No known information "
                         f"for examination {arguments.examination} "
@@ -380,43 +846,240 @@ def do_run(arguments):
         sys.exit(1)
     path = os.path.abspath(directory)
     # Load docker client:
+    # pylint: disable=import-outside-toplevel
+    import docker
+    # pylint: enable=import-outside-toplevel
     client = docker.from_env()
-    for entry in tools:
-        tool = entry["Tool"]
-        logging.info(f"{arguments.examination} {tool} {instance}...")
-        # client.images.pull(f"mccpetrinets/{tool.lower()}")
-        container = client.containers.run(
-            image=f"mccpetrinets/{tool.lower()}",
-            command="mcc-head",
-            auto_remove=False,
-            stdout=True,
-            stderr=True,
-            detach=True,
-            working_dir="/mcc-data",
-            volumes={
-                f"{path}": {
-                    "bind": "/mcc-data",
-                    "mode": "rw",
-                },
-            },
-            environment={
-                "BK_LOG_FILE": "/mcc-data/log",
-                "BK_EXAMINATION": f"{arguments.examination}",
-                "BK_TIME_CONFINEMENT": "3600",
-                "BK_INPUT": f"{instance}",
-                "BK_TOOL": tool.lower(),
-            },
-        )
-        for line in container.logs(stream=True):
-            logging.info(line.decode("UTF-8").strip())
-        result = container.wait()
-        container.remove()
-        if result["StatusCode"] == 0:
+    # Containers of the pool are kept for the next runs:
+    context = RunContext(
+        client, cache,
+        pool_of(arguments, client, cache, True),
+        results_log_of(arguments, arguments.cpus),
+    )
+    scheduler = Scheduler(
+        arguments.time, arguments.minimum_time, known_tools, STARTED,
+    )
+    run = {
+        "Examination": arguments.examination,
+        "Instance": instance,
+        "Path": path,
+        "Limits": limits_of(arguments),
+        "Confinement": int(scheduler.remaining()),
+        "Scratch": None,
+    }
+    if arguments.portfolio > 1:
+        # Complete the portfolio with the known ranking of tools:
+        portfolio = [entry["Tool"] for entry in tools]
+        for entry in known_tools or []:
+            if entry["Tool"] not in portfolio:
+                portfolio.append(entry["Tool"])
+        portfolio = portfolio[:arguments.portfolio]
+        if run_portfolio(context, run, portfolio) is not None:
             sys.exit(0)
+        logging.error(f"CANNOT COMPUTE")
+        sys.exit(1)
+    if run_tools(context, run, tools, scheduler):
+        sys.exit(0)
     logging.error(f"CANNOT COMPUTE")
     sys.exit(1)
 
 
+def run_tool(context, run, answers):
+    """
+    Runs a tool, and stores in answers the first answer
+    to each formula that is not already answered.
+    Returns the result of its container.
+    """
+    container = start_tool(context, run)
+    with contextlib.ExitStack() as stack:
+        stack.callback(remove_tool, container)
+        telemetry = Telemetry(container, context.pool is not None)
+        stack.callback(telemetry.done.set)
+        # Kill the tool if it does not respect its time confinement:
+        timer = threading.Timer(
+            run["Confinement"], stop_tool, args=(container,),
+        )
+        timer.start()
+        stack.callback(timer.cancel)
+        lines = []
+        for line in container.logs(stream=True):
+            line = line.decode("UTF-8").strip()
+            lines.append(line)
+            result = result_of(line)
+            if result is None:
+                logging.info(line)
+            elif result[1] in UNANSWERED:
+                logging.debug(line)
+            elif result[0] not in answers:
+                answers[result[0]] = line
+                logging.info(line)
+        result = container.wait()
+        timer.cancel()
+        measures = telemetry.stop()
+    if context.log is not None:
+        context.log.append(run, lines, result, measures)
+    return result
+
+
+def run_tools(context, run, tools, scheduler):
+    """
+    Runs tools one after the other, giving to each tool only the formulas
+    that are still unanswered, and a part of the remaining time.
+    Returns True if the last tool has exited normally,
+    or if at least one answer has been given.
+    """
+    examination = run["Examination"]
+    formulas = formulas_of(run["Path"], examination)
+    answers = {}
+    result = None
+    for index, entry in enumerate(tools):
+        tool = entry["Tool"]
+        if formulas is not None:
+            remaining = [x for x in formulas if x not in answers]
+            if not remaining:
+                break
+        # Allocate time to the tool, according to the remaining budget:
+        confinement = scheduler.slice_of(
+            tool, [x["Tool"] for x in tools[index:]],
+        )
+        if confinement is None:
+            logging.warning(f"Remaining time is too small to run {tool}.")
+            break
+        tool_run = dict(run, Tool=tool, Confinement=confinement)
+        with tempfile.TemporaryDirectory() as directory:
+            if formulas is not None and answers:
+                tool_run["Path"] = os.path.realpath(directory) + "/model"
+                restrict(run["Path"], examination, remaining, tool_run["Path"])
+                logging.info(f"Giving {len(remaining)} unanswered formulas "
+                             f"to {tool}.")
+            elif context.cache is not None:
+                # The cached model is read-only, the tool writes in a scratch:
+                tool_run["Scratch"] = os.path.realpath(directory)
+            logging.info(f"{examination} {tool} {run['Instance']} "
+                         f"with {confinement}s...")
+            # client.images.pull(f"mccpetrinets/{tool.lower()}")
+            result = run_tool(context, tool_run, answers)
+        if formulas is None and result["StatusCode"] == 0:
+            return True
+    return bool(answers) or (
+        result is not None and result["StatusCode"] == 0
+    )
+
+
+def test_tool(context, job, arguments, slots):
+    """
+    Tests a tool on an instance, on the CPUs of a free slot,
+    and returns a summary of the run.
+    """
+    # pylint: disable=import-outside-toplevel
+    import docker
+    # pylint: enable=import-outside-toplevel
+    examination, tool, instance = job
+    summary = {
+        "Examination": examination,
+        "Tool": tool,
+        "Instance": instance,
+        "Status": "fail",
+        "Time": 0,
+        "Memory": 0,
+    }
+    slot = slots.get()
+    temporary = tempfile.TemporaryDirectory()
+    directory = None
+    try:
+        directory = unarchive(
+            f"{arguments.models}/{instance}.tgz", temporary, context.cache,
+        )
+        if directory is None:
+            return summary
+        scratch = None
+        if context.cache is not None:
+            scratch = os.path.realpath(temporary.name)
+        limits = {}
+        if slot is not None:
+            limits["cpuset_cpus"] = slot
+        if arguments.memory is not None:
+            limits["mem_limit"] = arguments.memory
+        run = {
+            "Tool": tool,
+            "Examination": examination,
+            "Instance": instance,
+            "Path": directory,
+            "Limits": limits,
+            "Confinement": arguments.timeout,
+            "Scratch": scratch,
+        }
+        try:
+            container = start_tool(context, run)
+        except docker.errors.NotFound:
+            logging.warning(f"Docker image for {tool} does not exist.")
+            summary["Status"] = "missing"
+            return summary
+        with contextlib.ExitStack() as stack:
+            stack.callback(remove_tool, container)
+            telemetry = Telemetry(container, context.pool is not None)
+            stack.callback(telemetry.done.set)
+            timer = threading.Timer(
+                arguments.timeout, stop_tool, (container,),
+            )
+            timer.start()
+            stack.callback(timer.cancel)
+            result = container.wait()
+            timer.cancel()
+            measures = telemetry.stop()
+            summary["Time"] = measures["Clock Time"] / 1000
+            summary["Memory"] = measures["Memory"]
+            lines = [
+                line.decode("UTF-8").strip()
+                for line in container.logs().splitlines()
+            ]
+        for line in lines:
+            logging.debug(f"{tool} {examination}: {line}")
+        if context.log is not None:
+            context.log.append(run, lines, result, measures)
+        if summary["Time"] >= arguments.timeout:
+            summary["Status"] = "timeout"
+        elif result["StatusCode"] == 0:
+            summary["Status"] = "pass"
+        logging.info(f"Tested {examination} {tool} with {instance}: "
+                     f"{summary['Status']}.")
+        return summary
+    except docker.errors.APIError as error:
+        logging.warning(f"Test of {examination} {tool} with {instance} "
+                        f"failed: {error}")
+        return summary
+    finally:
+        if context.cache is not None and directory is not None:
+            context.cache.release(directory)
+        temporary.cleanup()
+        slots.put(slot)
+
+
+def slots_of(arguments):
+    """
+    Assigns CPUs to each concurrent test, as a queue of free slots.
+    Exits if there are not enough CPUs for all tests.
+    """
+    slots = queue.Queue()
+    if arguments.cpus_per_job is not None:
+        needed = arguments.jobs * arguments.cpus_per_job
+        if arguments.cpus_per_job < 1 or needed > os.cpu_count():
+            logging.error(
+                f"Cannot pin {arguments.jobs} tests "
+                f"to {arguments.cpus_per_job} CPUs each, "
+                f"as there are {os.cpu_count()} CPUs."
+            )
+            sys.exit(1)
+    for index in range(arguments.jobs):
+        if arguments.cpus_per_job is None:
+            slots.put(None)
+        else:
+            first = index * arguments.cpus_per_job
+            last = first + arguments.cpus_per_job - 1
+            slots.put(f"{first}-{last}")
+    return slots
+
+
 def do_test(arguments):
     """
     Main function for the test command.
@@ -427,6 +1090,8 @@ def do_test(arguments):
         "renaming": RENAMING,
         "year": arguments.year,
         "exclude": [],
+        "columnar": arguments.columnar,
+        "parsed": arguments.parsed_cache,
     })
     # Read data:
     data.characteristics()
@@ -434,85 +1099,106 @@ def do_test(arguments):
     results = data.results()
     examinations = {x["Examination"] for x in results}
     tools = {x["Tool"] for x in results}
+    # Find the fastest instance for each examination and tool:
+    fastest = {}
+    for entry in results:
+        key = (entry["Examination"], entry["Tool"])
+        if key not in fastest or entry["Time"] < fastest[key]["Time"]:
+            fastest[key] = entry
     # Use arguments:
-    path = arguments.models
     if arguments.examination is not None:
         examinations = [arguments.examination]
     if arguments.tool is not None:
         tools = [arguments.tool]
-    # Load docker client:
-    client = docker.from_env()
-    tested = {}
-    for examination in examinations:
-        tested[examination] = {}
-        for tool in tools:
-            instances = sorted([
-                entry for entry in results
-                if entry["Examination"] == examination
-                and entry["Tool"] == tool
-            ], key=lambda e: e["Time"])
+    jobs = []
+    for examination in sorted(examinations):
+        for tool in sorted(tools):
             if arguments.instance:
-                instances = [{
-                    "Examination": examination,
-                    "Tool": tool,
-                    "Instance": arguments.instance,
-                }]
-            if instances:
-                instance = instances[0]["Instance"]
-                logging.info("")
-                logging.info("==============================================")
-                logging.info(f"Testing {examination} {tool} with {instance}.")
-                logging.info("==============================================")
-                logging.info("")
+                jobs.append((examination, tool, arguments.instance))
+            elif (examination, tool) in fastest:
+                instance = fastest[examination, tool]["Instance"]
+                jobs.append((examination, tool, instance))
             else:
-                logging.info("")
-                logging.info("==============================================")
                 logging.warning(f"No test for {examination} {tool}.")
-                logging.info("==============================================")
-                logging.info("")
-                continue
-            directory = unarchive(f"{path}/{instance}.tgz")
-            try:
-                container = client.containers.run(
-                    image=f"mccpetrinets/{tool.lower()}",
-                    command="mcc-head",
-                    auto_remove=False,
-                    stdout=True,
-                    stderr=True,
-                    detach=True,
-                    working_dir="/mcc-data",
-                    volumes={
-                        f"{directory}": {
-                            "bind": "/mcc-data",
-                            "mode": "rw",
-                        },
-                    },
-                    environment={
-                        "BK_LOG_FILE": "/mcc-data/log",
-                        "BK_EXAMINATION": f"{examination}",
-                        "BK_TIME_CONFINEMENT": "3600",
-                        "BK_INPUT": f"{instance}",
-                        "BK_TOOL": tool,
-                    },
-                )
-                for line in container.logs(stream=True):
-                    logging.info(line.decode("UTF-8").strip())
-                result = container.wait()
-                container.remove()
-                tested[examination][tool] = result["StatusCode"] == 0
-            except docker.errors.NotFound:
-                logging.warning(f"Docker image does not exist.")
-                tested[examination][tool] = False
-    for examination, subresults in tested.items():
-        logging.info(f"Tests for {examination}:")
-        for tool, value in subresults.items():
-            logging.info(f"  {tool}: {value}")
+    cache = cache_of(arguments)
+    slots = slots_of(arguments)
+    # Load docker client:
+    # pylint: disable=import-outside-toplevel
+    import docker
+    # pylint: enable=import-outside-toplevel
+    client = docker.from_env()
+    context = RunContext(
+        client, cache,
+        pool_of(arguments, client, cache, False),
+        results_log_of(arguments, arguments.cpus_per_job),
+    )
+    try:
+        with ThreadPoolExecutor(max_workers=arguments.jobs) as executor:
+            summaries = list(executor.map(
+                lambda job: test_tool(context, job, arguments, slots),
+                jobs,
+            ))
+    finally:
+        if context.pool is not None:
+            context.pool.close()
+    logging.info(f"{'Examination':<25} {'Tool':<12} {'Status':<8} "
+                 f"{'Time (s)':>9} {'Memory (MB)':>12}  Instance")
+    for summary in summaries:
+        logging.info(f"{summary['Examination']:<25} {summary['Tool']:<12} "
+                     f"{summary['Status']:<8} {summary['Time']:>9.1f} "
+                     f"{summary['Memory'] / 2**20:>12.1f}  "
+                     f"{summary['Instance']}")
+    for status in ["pass", "fail", "timeout", "missing"]:
+        count = len([x for x in summaries if x["Status"] == status])
+        logging.info(f"{status}: {count}")
+
+
+def experiment_score(entry):
+    """
+    Sums the scores of an experiment entry over all examinations.
+    """
+    return 0 \
+        + entry["StateSpace"] \
+        + entry["UpperBounds"] \
+        + entry["ReachabilityDeadlock"] \
+        + entry["ReachabilityCardinality"] \
+        + entry["ReachabilityFireability"] \
+        + entry["CTLCardinality"] \
+        + entry["CTLFireability"] \
+        + entry["LTLCardinality"] \
+        + entry["LTLFireability"]
+
+
+def run_experiment(arguments, data, tasks, kind, lines_of):
+    """
+    Runs the (key, options) tasks of an experiment, possibly in parallel,
+    and streams the lines computed by lines_of(key, entry)
+    into the <kind>-<algorithm>.dat files as soon as each task finishes.
+    """
+    # pylint: disable=import-outside-toplevel
+    from mcc4mcc.analysis import learned_all
+    # pylint: enable=import-outside-toplevel
+    outputs = {}
+    with contextlib.ExitStack() as stack:
+        for key, subresult in learned_all(data, tasks, arguments.jobs):
+            for entry in subresult:
+                algorithm = entry["Algorithm"]
+                if algorithm not in outputs:
+                    outputs[algorithm] = stack.enter_context(open(
+                        f"{arguments.data}/{kind}-{algorithm}.dat", "w"
+                    ))
+                for line in lines_of(key, entry):
+                    outputs[algorithm].write(line + "\n")
+                outputs[algorithm].flush()
 
 
 def do_experiment(arguments):
     """
     Main function for the experiment command.
     """
+    # pylint: disable=import-outside-toplevel
+    from mcc4mcc.analysis import max_score, characteristics_of, REMOVE
+    # pylint: enable=import-outside-toplevel
     # Load data:
     data = Data({
         "characteristics": arguments.characteristics,
@@ -520,6 +1206,8 @@ def do_experiment(arguments):
         "renaming": RENAMING,
         "exclude": [],
         "year": arguments.year,
+        "columnar": arguments.columnar,
+        "parsed": arguments.parsed_cache,
     })
     # Read data:
     data.characteristics()
@@ -532,72 +1220,47 @@ def do_experiment(arguments):
         "Duplicates": arguments.duplicates,
         "Score": arguments.score,
     })
+    # Each task uses its own seed, as tasks may run in other processes:
+    random.seed(arguments.seed)
     if arguments.assess:
         logging.info(f"Assess efficiency of algorithms.")
-        results = []
-        options = {
-            "Duplicates": arguments.duplicates,
-            "Training": 1,
-            "Forget": [],
-            "Score": arguments.score,
-        }
-        for _ in range(0, arguments.repeat):
-            subresult = learned(data, options)[0]
-            results = results + subresult
-        # Output:
-        algorithms = {x["Algorithm"] for x in results}
-        for algorithm in algorithms:
-            with open(f"{arguments.data}/assess-{algorithm}.dat", "w") \
-                    as output:
-                for examination in examinations:
-                    for entry in [
-                            x for x in results
-                            if x["Algorithm"] == algorithm
-                    ]:
-                        score = math.ceil(
-                            100 * entry[examination] / maxs[examination]
-                        )
-                        output.write(
-                            str(examination) + "\t" +
-                            str(score) + "\n"
-                        )
+        tasks = []
+        for repetition in range(0, arguments.repeat):
+            tasks.append((repetition, {
+                "Duplicates": arguments.duplicates,
+                "Training": 1,
+                "Forget": [],
+                "Score": arguments.score,
+                "Seed": random.randrange(2**32),
+            }))
+        run_experiment(
+            arguments, data, tasks, "assess",
+            lambda _, entry: [
+                str(examination) + "\t" + str(math.ceil(
+                    100 * entry[examination] / maxs[examination]
+                ))
+                for examination in examinations
+            ],
+        )
     if arguments.training:
-        results = []
+        tasks = []
         for value in range(0, 100, 10):
             training = 1 - (value / 100)
             logging.info(f"Running experiment with {training} training.")
-            options = {
-                "Duplicates": arguments.duplicates,
-                "Training": training,
-                "Forget": [],
-                "Score": arguments.score,
-            }
             for _ in range(0, arguments.repeat):
-                subresult = learned(data, options)[0]
-                for entry in subresult:
-                    entry["Training"] = training
-                results = results + subresult
-        # Output:
-        algorithms = {x["Algorithm"] for x in results}
-        for algorithm in algorithms:
-            with open(f"{arguments.data}/training-{algorithm}.dat", "w") \
-                    as output:
-                for entry in [
-                        x for x in results
-                        if x["Algorithm"] == algorithm
-                ]:
-                    training = entry["Training"]
-                    score = 0 \
-                        + entry["StateSpace"] \
-                        + entry["UpperBounds"] \
-                        + entry["ReachabilityDeadlock"] \
-                        + entry["ReachabilityCardinality"] \
-                        + entry["ReachabilityFireability"] \
-                        + entry["CTLCardinality"] \
-                        + entry["CTLFireability"] \
-                        + entry["LTLCardinality"] \
-                        + entry["LTLFireability"]
-                    output.write(str(training) + "\t" + str(score) + "\n")
+                tasks.append((training, {
+                    "Duplicates": arguments.duplicates,
+                    "Training": training,
+                    "Forget": [],
+                    "Score": arguments.score,
+                    "Seed": random.randrange(2**32),
+                }))
+        run_experiment(
+            arguments, data, tasks, "training",
+            lambda training, entry: [
+                str(training) + "\t" + str(experiment_score(entry))
+            ],
+        )
     if arguments.forget is not None:
         characteristics = []
         for characteristic in CHARACTERISTICS:
@@ -632,7 +1295,7 @@ def do_experiment(arguments):
         for characteristic in CHARACTERISTICS:
             if characteristic not in REMOVE:
                 characteristics.append(characteristic)
-        results = []
+        tasks = []
         for forget_n in range(0, len(characteristics)+1):
             for _ in range(0, arguments.repeat):
                 random.shuffle(characteristics)
@@ -643,33 +1306,16 @@ def do_experiment(arguments):
                     "Training": 1.0,
                     "Forget": forget,
                     "Score": arguments.score,
+                    "Seed": random.randrange(2**32),
                 }
-                subresult, subchars = characteristics_of(data, options)
-                subresult = learned(data, options)[0]
-                for entry in subresult:
-                    entry["Characteristics"] = len(subchars)-1
-                results = results + subresult
-        # Output:
-        algorithms = {x["Algorithm"] for x in results}
-        for algorithm in algorithms:
-            with open(f"{arguments.data}/forget-{algorithm}.dat", "w") \
-                    as output:
-                for entry in [
-                        x for x in results
-                        if x["Algorithm"] == algorithm
-                ]:
-                    chars = entry["Characteristics"]
-                    score = 0 \
-                        + entry["StateSpace"] \
-                        + entry["UpperBounds"] \
-                        + entry["ReachabilityDeadlock"] \
-                        + entry["ReachabilityCardinality"] \
-                        + entry["ReachabilityFireability"] \
-                        + entry["CTLCardinality"] \
-                        + entry["CTLFireability"] \
-                        + entry["LTLCardinality"] \
-                        + entry["LTLFireability"]
-                    output.write(str(chars) + "\t" + str(score) + "\n")
+                _, subchars = characteristics_of(data, options)
+                tasks.append((len(subchars)-1, options))
+        run_experiment(
+            arguments, data, tasks, "forget",
+            lambda chars, entry: [
+                str(chars) + "\t" + str(experiment_score(entry))
+            ],
+        )
 
 
 logging.basicConfig(
@@ -695,10 +1341,19 @@ EXTRACT = SUBPARSERS.add_parser(
 )
 EXTRACT.add_argument(
     "--results",
-    help="path to the results of the model checking contest",
+    help="paths to the results of the model checking contest "
+         "or of local runs (the first ones have priority)",
     type=str,
+    nargs="+",
     dest="results",
-    default=os.getcwd() + "/results.csv",
+    default=[os.getcwd() + "/results.csv"],
+)
+EXTRACT.add_argument(
+    "--incremental",
+    help="Update the artifacts of the previous extraction "
+         "when results change",
+    dest="incremental",
+    action="store_true",
 )
 EXTRACT.add_argument(
     "--characteristics",
@@ -707,6 +1362,19 @@ EXTRACT.add_argument(
     dest="characteristics",
     default=os.getcwd() + "/characteristics.csv",
 )
+EXTRACT.add_argument(
+    "--columnar",
+    help="Read results using the columnar (pandas) backend",
+    dest="columnar",
+    action="store_true",
+)
+EXTRACT.add_argument(
+    "--parsed-cache",
+    help="directory of the cache of parsed results and characteristics",
+    dest="parsed_cache",
+    type=str,
+    default=os.getenv("MCC4MCC_PARSED_CACHE"),
+)
 EXTRACT.add_argument(
     "--year",
     help="Use results for a specific year (YYYY format).",
@@ -752,6 +1420,28 @@ EXTRACT.add_argument(
     type=str,
     default="mcc",
 )
+EXTRACT.add_argument(
+    "--top",
+    help="also compute scores when algorithms choose "
+         "the best of their top ranked tools",
+    dest="top",
+    type=int,
+    default=1,
+)
+EXTRACT.add_argument(
+    "--jobs",
+    help="number of processes used to train algorithms",
+    dest="jobs",
+    type=int,
+    default=1,
+)
+EXTRACT.add_argument(
+    "--seed",
+    help="seed for random splits and algorithms, for reproducible runs",
+    dest="seed",
+    type=int,
+    default=None,
+)
 EXTRACT.set_defaults(func=do_extract)
 
 TEST = SUBPARSERS.add_parser(
@@ -772,6 +1462,19 @@ TEST.add_argument(
     dest="characteristics",
     default=os.getcwd() + "/characteristics.csv",
 )
+TEST.add_argument(
+    "--columnar",
+    help="Read results using the columnar (pandas) backend",
+    dest="columnar",
+    action="store_true",
+)
+TEST.add_argument(
+    "--parsed-cache",
+    help="directory of the cache of parsed results and characteristics",
+    dest="parsed_cache",
+    type=str,
+    default=os.getenv("MCC4MCC_PARSED_CACHE"),
+)
 TEST.add_argument(
     "--year",
     help="Use results for a specific year (YYYY format).",
@@ -809,6 +1512,60 @@ TEST.add_argument(
     dest="exclude",
     default=None,
 )
+TEST.add_argument(
+    "--jobs",
+    help="number of tests to run concurrently",
+    dest="jobs",
+    type=int,
+    default=1,
+)
+TEST.add_argument(
+    "--cpus-per-job",
+    help="number of CPUs pinned to each concurrent test",
+    dest="cpus_per_job",
+    type=int,
+)
+TEST.add_argument(
+    "--memory",
+    help="memory allowed for each test (for instance 8g)",
+    dest="memory",
+    type=str,
+)
+TEST.add_argument(
+    "--timeout",
+    help="time (in seconds) allowed for each test",
+    dest="timeout",
+    type=int,
+    default=3600,
+)
+TEST.add_argument(
+    "--cache",
+    help="directory of the cache of extracted models",
+    dest="cache",
+    type=str,
+    default=os.getenv("MCC4MCC_CACHE"),
+)
+TEST.add_argument(
+    "--cache-size",
+    help="maximum size (in MB) of the cache of extracted models",
+    dest="cache_size",
+    type=int,
+    default=10240,
+)
+TEST.add_argument(
+    "--pool",
+    help="directory of the jobs of pooled tool containers",
+    dest="pool",
+    type=str,
+    default=os.getenv("MCC4MCC_POOL"),
+)
+TEST.add_argument(
+    "--results-log",
+    help="file in which tool runs are appended in the results.csv format",
+    dest="results_log",
+    type=str,
+    default=os.getenv("MCC4MCC_RESULTS_LOG"),
+)
 TEST.set_defaults(func=do_test)
 
 
@@ -885,6 +1642,74 @@ RUN.add_argument(
     dest="cheat",
     action="store_true",
 )
+RUN.add_argument(
+    "--time",
+    help="time budget (in seconds) for all tools",
+    dest="time",
+    type=int,
+    default=int(os.getenv("BK_TIME_CONFINEMENT", "3600")),
+)
+RUN.add_argument(
+    "--minimum-time",
+    help="minimum time (in seconds) worth allocating to a tool",
+    dest="minimum_time",
+    type=int,
+    default=60,
+)
+RUN.add_argument(
+    "--top",
+    help="number of learned tools to try one after the other",
+    dest="top",
+    type=int,
+    default=1,
+)
+RUN.add_argument(
+    "--portfolio",
+    help="number of tools to run concurrently",
+    dest="portfolio",
+    type=int,
+    default=1,
+)
+RUN.add_argument(
+    "--cpus",
+    help="number of CPUs allowed for each tool (for instance 1.5)",
+    dest="cpus",
+    type=float,
+)
+RUN.add_argument(
+    "--memory",
+    help="memory allowed for each tool (for instance 8g)",
+    dest="memory",
+    type=str,
+)
+RUN.add_argument(
+    "--cache",
+    help="directory of the cache of extracted models",
+    dest="cache",
+    type=str,
+    default=os.getenv("MCC4MCC_CACHE"),
+)
+RUN.add_argument(
+    "--cache-size",
+    help="maximum size (in MB) of the cache of extracted models",
+    dest="cache_size",
+    type=int,
+    default=10240,
+)
+RUN.add_argument(
+    "--pool",
+    help="directory of the jobs of pooled tool containers",
+    dest="pool",
+    type=str,
+    default=os.getenv("MCC4MCC_POOL"),
+)
+RUN.add_argument(
+    "--results-log",
+    help="file in which tool runs are appended in the results.csv format",
+    dest="results_log",
+    type=str,
+    default=os.getenv("MCC4MCC_RESULTS_LOG"),
+)
 RUN.set_defaults(func=do_run)
 
 EXPERIMENT = SUBPARSERS.add_parser(
@@ -905,6 +1730,19 @@ EXPERIMENT.add_argument(
     dest="characteristics",
     default=os.getcwd() + "/characteristics.csv",
 )
+EXPERIMENT.add_argument(
+    "--columnar",
+    help="Read results using the columnar (pandas) backend",
+    dest="columnar",
+    action="store_true",
+)
+EXPERIMENT.add_argument(
+    "--parsed-cache",
+    help="directory of the cache of parsed results and characteristics",
+    dest="parsed_cache",
+    type=str,
+    default=os.getenv("MCC4MCC_PARSED_CACHE"),
+)
 EXPERIMENT.add_argument(
     "--year",
     help="Use results for a specific year (YYYY format).",
@@ -949,6 +1787,20 @@ EXPERIMENT.add_argument(
     dest="repeat",
     default=1,
 )
+EXPERIMENT.add_argument(
+    "--jobs",
+    help="number of processes used to run repetitions",
+    dest="jobs",
+    type=int,
+    default=1,
+)
+EXPERIMENT.add_argument(
+    "--seed",
+    help="seed for random splits and algorithms, for reproducible runs",
+    dest="seed",
+    type=int,
+    default=None,
+)
 EXPERIMENT.set_defaults(func=do_experiment)
 
 
@@ -4,6 +4,7 @@ Machine learning algorithms used by mcc4mcc
 
 This module returns a dictionary from identifiers to the algorithms,
 as objects that conform to scikit-learn.
+Each algorithm is built from a seed (or None) used as its random state.
 """
 
 
@@ -11,7 +12,6 @@ from collections import Counter
 import numpy
 from sklearn.tree import DecisionTreeClassifier
 from sklearn.base import BaseEstimator, ClassifierMixin
-from sklearn.neighbors import KNeighborsClassifier
 from sklearn.ensemble import BaggingClassifier, AdaBoostClassifier
 from sklearn.naive_bayes import GaussianNB
 from sklearn.svm import SVC, LinearSVC
@@ -19,17 +19,25 @@ from sklearn.ensemble import RandomForestClassifier, VotingClassifier
 from sklearn.neural_network import MLPClassifier
 
 
-class BMDT(BaseEstimator, ClassifierMixin):
+class BMDT(ClassifierMixin, BaseEstimator):
     """
     Custom classification algorithm
     """
 
-    def __init__(self):
-        self.binary = DecisionTreeClassifier()
-        self.multi = DecisionTreeClassifier()
+    def __init__(self, random_state=None):
+        self.random_state = random_state
+        self.binary = DecisionTreeClassifier(random_state=random_state)
+        self.multi = DecisionTreeClassifier(random_state=random_state)
         self.majority_class = None
         self.classes = None
 
+    @property
+    def classes_(self):
+        """
+        Classes seen during training, as in scikit-learn classifiers.
+        """
+        return self.classes
+
     def fit(self, training_x, training_y):
         """
         Trains using the training vector features and a training class vector.
@@ -57,6 +65,7 @@ class BMDT(BaseEstimator, ClassifierMixin):
             self.multi.fit(training_x[mask], training_y[mask])
         else:
             self.multi.fit(training_x, training_y)
+        return self
 
     def predict(self, test_x):
         """
@@ -81,18 +90,20 @@ class BMDT(BaseEstimator, ClassifierMixin):
 
     def predict_proba(self, test_x):
         """
-        Predicts the probability of each classe to be the good one.
+        Predicts the probability of each class to be the good one:
+        the majority class gets the probability of the binary classifier,
+        and other classes share the remaining probability
+        as given by the multi-class classifier.
         """
         test_x = numpy.array(test_x)
-        mask = self.classes == self.majority_class
-        # Multi probability:
-        y_pred = self.multi.predict_proba(test_x)
-        # Binary probability:
-        res_binary = self.binary.predict_proba(test_x)
-        # Multiply the binary and the multi on the right place:
-        y_pred[:, mask][:, 0] *= res_binary[:, 0]
-        for index, line in enumerate(y_pred[:, ~mask]):
-            y_pred[:, ~mask][index] = line * res_binary[:, 1][index]
+        binary = self.binary.predict_proba(test_x)
+        majority = binary[
+            :, self.binary.classes_ == self.majority_class
+        ].sum(axis=1, keepdims=True)
+        y_pred = numpy.zeros((test_x.shape[0], self.classes.shape[0]))
+        columns = numpy.searchsorted(self.classes, self.multi.classes_)
+        y_pred[:, columns] = self.multi.predict_proba(test_x) * (1 - majority)
+        y_pred[:, self.classes == self.majority_class] += majority
         # Return array of probability
         return y_pred
 
@@ -100,8 +111,7 @@ class BMDT(BaseEstimator, ClassifierMixin):
         """
         Parameters of the model.
         """
-        # Suppose this estimator has parameters "alpha" and "recursive"
-        return {}
+        return {"random_state": self.random_state}
 
     def set_params(self, **parameters):
         """
@@ -131,6 +141,159 @@ def knn_distance(lhs, rhs, bound=2):
     return diff.sum()
 
 
+# Number of distances computed at once by knn_distances and KNN:
+KNN_CHUNK = 2**22
+
+
+def knn_distances(lhs, rhs, bound=2, chunk=KNN_CHUNK):
+    """
+    Computes knn_distance between each row of lhs and each row of rhs,
+    using numpy on blocks of rows instead of one call per pair.
+    """
+    lhs_mask = (lhs >= -1) & (lhs <= 1)
+    rhs_mask = (rhs >= -1) & (rhs <= 1)
+    result = numpy.empty((lhs.shape[0], rhs.shape[0]))
+    step = max(1, chunk // max(1, rhs.size))
+    for start in range(0, lhs.shape[0], step):
+        block = slice(start, start + step)
+        both = lhs_mask[block, None, :] & rhs_mask[None, :, :]
+        diff = numpy.where(
+            both,
+            numpy.abs(lhs[block, None, :] - rhs[None, :, :]),
+            bound,
+        )
+        result[block] = diff.sum(axis=2)
+    return result
+
+
+class KNN(ClassifierMixin, BaseEstimator):
+    """
+    K nearest neighbors classifier using knn_distance,
+    with neighbors weighted by the inverse of their distance.
+    It predicts as KNeighborsClassifier with metric=knn_distance
+    and algorithm="brute", including for neighbors tied at the k-th
+    distance, but computes distances with numpy by blocks of test vectors.
+    """
+
+    def __init__(self, n_neighbors=10, bound=2):
+        self.n_neighbors = n_neighbors
+        self.bound = bound
+        self.training_x = None
+        self.training_y = None
+        self.classes_ = None
+
+    def fit(self, training_x, training_y):
+        """
+        Stores the training vector features and class vector.
+        """
+        self.training_x = numpy.asarray(training_x, dtype=float)
+        self.classes_, self.training_y = numpy.unique(
+            numpy.asarray(training_y),
+            return_inverse=True,
+        )
+        return self
+
+    def kneighbors(self, test_x):
+        """
+        Returns the distances and indices of the nearest neighbors
+        of each test vector, selected as in the brute force search
+        of scikit-learn. Only the nearest neighbors of each block
+        of test vectors are kept.
+        """
+        test_x = numpy.asarray(test_x, dtype=float)
+        count = min(self.n_neighbors, self.training_x.shape[0])
+        distances = numpy.empty((test_x.shape[0], count))
+        indices = numpy.empty((test_x.shape[0], count), dtype=numpy.intp)
+        step = max(1, KNN_CHUNK // max(1, self.training_x.shape[0]))
+        for start in range(0, test_x.shape[0], step):
+            block = slice(start, start + step)
+            block_distances = knn_distances(
+                test_x[block], self.training_x, self.bound,
+            )
+            nearest = numpy.argpartition(
+                block_distances, count - 1, axis=1,
+            )[:, :count]
+            nearest_distances = numpy.take_along_axis(
+                block_distances, nearest, axis=1,
+            )
+            order = numpy.argsort(nearest_distances, axis=1)
+            indices[block] = numpy.take_along_axis(nearest, order, axis=1)
+            distances[block] = numpy.take_along_axis(
+                nearest_distances, order, axis=1,
+            )
+        return distances, indices
+
+    def predict_proba(self, test_x):
+        """
+        Predicts the probability of each class to be the good one.
+        """
+        distances, indices = self.kneighbors(test_x)
+        # Neighbors at distance 0 take all the weight, as in scikit-learn:
+        with numpy.errstate(divide="ignore"):
+            weights = 1 / distances
+        infinite = numpy.isinf(weights)
+        rows = infinite.any(axis=1)
+        weights[rows] = infinite[rows]
+        result = numpy.zeros((indices.shape[0], self.classes_.shape[0]))
+        for column in range(indices.shape[1]):
+            result[
+                numpy.arange(indices.shape[0]),
+                self.training_y[indices[:, column]],
+            ] += weights[:, column]
+        total = result.sum(axis=1, keepdims=True)
+        total[total == 0] = 1
+        return result / total
+
+    def predict(self, test_x):
+        """
+        Predicts the class, based on given features vector.
+        """
+        return self.classes_[self.predict_proba(test_x).argmax(axis=1)]
+
+
+def ranking_of(algorithm, test_x, priors=None):
+    """
+    Ranks the classes for each test vector, from the most to the least
+    probable one, as lists of (class, probability).
+    Algorithms that cannot compute probabilities, such as LinearSVC,
+    give half of the probability to the predicted class,
+    and the other half according to priors: a dictionary of probabilities
+    of classes for each test vector, usually computed from known data.
+    """
+    if hasattr(algorithm, "predict_proba"):
+        classes = numpy.asarray(algorithm.classes_)
+        probabilities = algorithm.predict_proba(test_x)
+    else:
+        predicted = numpy.asarray(algorithm.predict(test_x))
+        priors = priors or [{} for _ in predicted]
+        classes = numpy.unique(numpy.concatenate([
+            predicted,
+            [key for prior in priors for key in prior],
+        ]).astype(predicted.dtype))
+        known = numpy.zeros((predicted.shape[0], classes.shape[0]))
+        for row, prior in enumerate(priors):
+            for key, probability in prior.items():
+                known[row, numpy.searchsorted(classes, key)] = probability
+        total = known.sum(axis=1, keepdims=True)
+        probabilities = numpy.zeros_like(known)
+        probabilities[
+            numpy.arange(predicted.shape[0]),
+            numpy.searchsorted(classes, predicted),
+        ] = 1
+        rows = total[:, 0] > 0
+        probabilities[rows] += known[rows] / total[rows]
+        probabilities[rows] /= 2
+    order = numpy.argsort(-probabilities, axis=1, kind="stable")
+    return [
+        [
+            (classes[column], probabilities[row, column])
+            for column in columns
+            if probabilities[row, column] > 0
+        ]
+        for row, columns in enumerate(order)
+    ]
+
+
 # Dictionary of algorithms to use.
 #
 # The "complex" key is a Boolean (or None) that tells if the algorithm
@@ -138,62 +301,58 @@ def knn_distance(lhs, rhs, bound=2):
 ALGORITHMS = {}
 
 ALGORITHMS["knn"] = lambda _: \
-    KNeighborsClassifier(
-        n_neighbors=10,
-        weights="distance",
-        metric=knn_distance,
-    )
+    KNN(n_neighbors=10)
 
-ALGORITHMS["bagging-knn"] = lambda _: \
+ALGORITHMS["bagging-knn"] = lambda seed: \
     BaggingClassifier(
-        KNeighborsClassifier(
-            n_neighbors=10,
-            weights="distance",
-            metric=knn_distance
-        ),
+        KNN(n_neighbors=10),
         max_samples=0.5,
         max_features=1,
         n_estimators=10,
+        random_state=seed,
     )
 
-ALGORITHMS["ada-boost"] = lambda _: \
-    AdaBoostClassifier()
+ALGORITHMS["ada-boost"] = lambda seed: \
+    AdaBoostClassifier(random_state=seed)
 
 ALGORITHMS["naive-bayes"] = lambda _: \
     GaussianNB()
 
-ALGORITHMS["svm"] = lambda _: \
-    SVC()
+ALGORITHMS["svm"] = lambda seed: \
+    SVC(random_state=seed)
 
-ALGORITHMS["linear-svm"] = lambda _: \
-    LinearSVC()
+ALGORITHMS["linear-svm"] = lambda seed: \
+    LinearSVC(random_state=seed)
 
-ALGORITHMS["decision-tree"] = lambda _: \
-    DecisionTreeClassifier()
+ALGORITHMS["decision-tree"] = lambda seed: \
+    DecisionTreeClassifier(random_state=seed)
 
-ALGORITHMS["random-forest"] = lambda _: \
+ALGORITHMS["random-forest"] = lambda seed: \
     RandomForestClassifier(
         n_estimators=30,
         max_features=None,
+        random_state=seed,
     )
 
-ALGORITHMS["neural-network"] = lambda _: \
+ALGORITHMS["neural-network"] = lambda seed: \
     MLPClassifier(
         solver="lbfgs",
+        random_state=seed,
     )
 
-ALGORITHMS["voting-classifier"] = lambda _: \
+ALGORITHMS["voting-classifier"] = lambda seed: \
     VotingClassifier(
         [
-            ("decision-tree", DecisionTreeClassifier()),
+            ("decision-tree", DecisionTreeClassifier(random_state=seed)),
             ("random-forest", RandomForestClassifier(
                 n_estimators=30,
                 max_features=None,
+                random_state=seed,
             )),
-            ("svm", SVC(probability=True)),
+            ("svm", SVC(probability=True, random_state=seed)),
         ],
         voting="soft"
     )
 
-ALGORITHMS["bmdt"] = lambda _: \
-    BMDT()
+ALGORITHMS["bmdt"] = lambda seed: \
+    BMDT(random_state=seed)
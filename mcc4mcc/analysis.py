@@ -3,17 +3,22 @@ Analysis of the results of the model checking contest.
 """
 
 import copy
+import hashlib
+import json
 import math
+from concurrent.futures import ProcessPoolExecutor, as_completed
 import logging
 import pickle
 import statistics
-from random import shuffle
+from random import Random, shuffle
 import pandas
 from frozendict import frozendict
 from tqdm import tqdm
 from sklearn import tree
 from mcc4mcc.model import Values, TECHNIQUES
-from mcc4mcc.algorithms import ALGORITHMS
+from mcc4mcc.algorithms import ALGORITHMS, ranking_of
+from mcc4mcc.encoder import Encoder, encode
+from mcc4mcc.selector import vector_key
 
 REMOVE = [
     "Id", "Model", "Instance", "Year",
@@ -53,138 +58,270 @@ def characteristics_of(data, options):
     return result, all_characteristics
 
 
+def index_for(data, options):
+    """
+    Returns the results grouped by examination,
+    restricted to the examinations given in the options if any.
+    """
+    index = data.index()
+    if "Examinations" in options:
+        return {
+            examination: index[examination]
+            for examination in options["Examinations"]
+            if examination in index
+        }
+    return index
+
+
+def digests_of(data):
+    """
+    Computes a digest of the results of each examination,
+    to find the examinations whose results have changed.
+    """
+    result = {}
+    for examination, for_examination in data.index().items():
+        rows = []
+        for for_model in for_examination.values():
+            for for_instance in for_model.values():
+                for entries in for_instance.values():
+                    for entry in entries:
+                        rows.append(json.dumps({
+                            key: value["Id"] if key == "Model" else value
+                            for key, value in entry.items()
+                            if key not in TECHNIQUES
+                        }, sort_keys=True, default=str))
+        hasher = hashlib.md5()
+        for row in sorted(rows):
+            hasher.update(bytearray(row, "utf8"))
+        result[examination] = hasher.hexdigest()
+    return result
+
+
+def digest_of(dataframe):
+    """
+    Computes a digest of a training set.
+    """
+    hasher = hashlib.md5()
+    hasher.update(bytearray(json.dumps(list(dataframe.columns)), "utf8"))
+    hasher.update(
+        pandas.util.hash_pandas_object(dataframe, index=False).values
+    )
+    return hasher.hexdigest()
+
+
+def predictions_inputs(data, values, options):
+    """
+    Encodes the features of each examination and model for prediction.
+    """
+    keys = []
+    tests = []
+    for examination, for_examination in data.index().items():
+        for model in for_examination:
+            test = {}
+            test["Examination"] = examination
+            test["Relative-Time"] = 1  # FIXME
+            test["Relative-Memory"] = 1  # FIXME
+            for key, value in model.items():
+                if key in options["Forget"] \
+                        or (key not in REMOVE and key not in TECHNIQUES):
+                    test[key] = value
+            keys.append((examination, model))
+            tests.append(test)
+    return keys, encode(pandas.DataFrame(tests), values, options["Forget"])
+
+
+def selected_inputs(keys, tests, options):
+    """
+    Keeps the inputs of the examinations given in the options if any.
+    """
+    if "Examinations" in options:
+        mask = [key[0] in options["Examinations"] for key in keys]
+        keys = [key for key, keep in zip(keys, mask) if keep]
+        tests = tests[mask]
+    return keys, tests
+
+
+def predictions_of(data, algorithm, options):
+    """
+    Predicts the tool chosen by an algorithm for each examination and model,
+    using a single call to predict for all of them.
+    """
+    if "Values" in options:
+        values = options["Values"]
+    else:
+        values = Values(None)
+    keys, tests = selected_inputs(
+        *predictions_inputs(data, values, options), options,
+    )
+    if not keys:
+        return {}
+    predicted = algorithm.predict(tests)
+    tools = {x: values.from_learning(x) for x in set(predicted)}
+    return {
+        key: tools[tool]
+        for key, tool in zip(keys, predicted)
+    }
+
+
+def priors_of(data, options):
+    """
+    Computes for each examination the probability of each tool
+    to be a good one, from known data: the ratio of models
+    on which the tool has results.
+    """
+    result = {}
+    for examination, for_examination in index_for(data, options).items():
+        counts = {}
+        for for_model in for_examination.values():
+            for tool in {
+                    tool
+                    for for_instance in for_model.values()
+                    for tool in for_instance}:
+                counts[tool] = counts.get(tool, 0) + 1
+        total = sum(counts.values())
+        result[examination] = {
+            tool: count / total
+            for tool, count in sorted(counts.items())
+        }
+    return result
+
+
+def rankings_of(data, algorithm, options):
+    """
+    Ranks the tools for each examination and model,
+    from the most to the least probable one, as lists of (tool, probability),
+    using a single call to the algorithm for all of them.
+    Known data is used for algorithms that cannot compute probabilities.
+    """
+    if "Values" in options:
+        values = options["Values"]
+    else:
+        values = Values(None)
+    keys, tests = selected_inputs(
+        *predictions_inputs(data, values, options), options,
+    )
+    if not keys:
+        return {}
+    priors = {
+        examination: {
+            values.to_learning(tool): probability
+            for tool, probability in for_examination.items()
+        }
+        for examination, for_examination in priors_of(data, options).items()
+    }
+    rankings = ranking_of(
+        algorithm,
+        tests,
+        [priors.get(examination, {}) for examination, _ in keys],
+    )
+    return {
+        key: [
+            (values.from_learning(tool), float(probability))
+            for tool, probability in ranking
+        ]
+        for key, ranking in zip(keys, rankings)
+    }
+
+
 def choice_of(data, alg_or_tool, options):
     """
     Computes for each examination the repartition of choices.
     """
     result = {}
     results = data.results()
+    index = index_for(data, options)
     data.characteristics()
-    examinations = {x["Examination"] for x in results}
-    models = {x["Model"] for x in results}
     tools = {x["Tool"] for x in results}
-    with tqdm(total=len(examinations)*len(models)) as counter:
-        for examination in examinations:
-            for_examination = [
-                x for x in results
-                if x["Examination"] == examination
-            ]
+    predictions = None
+    if alg_or_tool not in tools and not isinstance(alg_or_tool, str):
+        predictions = predictions_of(data, alg_or_tool, options)
+    with tqdm(total=sum(len(x) for x in index.values())) as counter:
+        for examination, for_examination in index.items():
             result[examination] = {}
             for tool in tools:
                 result[examination][tool] = 0
-            for model in models:
-                for_model = [
-                    x for x in for_examination
-                    if x["Model"] is model
-                ]
-                if not for_model:
-                    counter.update(1)
-                    continue
-                if alg_or_tool in tools:
-                    tool = alg_or_tool
-                elif isinstance(alg_or_tool, str):
+            for model in for_examination:
+                if predictions is None:
                     tool = alg_or_tool
                 else:
-                    test = {}
-                    if "Values" in options:
-                        values = options["Values"]
-                    else:
-                        values = Values(None)
-                    test["Examination"] = values.to_learning(examination)
-                    test["Relative-Time"] = 1  # FIXME
-                    test["Relative-Memory"] = 1  # FIXME
-                    for key, value in model.items():
-                        if key in options["Forget"]:
-                            test[key] = values.to_learning(None)
-                        elif key not in REMOVE \
-                                and key not in TECHNIQUES:
-                            test[key] = values.to_learning(value)
-                    dataframe = pandas.DataFrame([test])
-                    predicted = alg_or_tool.predict(dataframe)
-                    tool = values.from_learning(predicted[0])
+                    tool = predictions[examination, model]
                 result[examination][tool] += 1
                 counter.update(1)
     return result
 
 
+def instance_score(entries, options):
+    """
+    Computes the score of a tool on an instance, from its entries.
+    """
+    if not entries:
+        return 0
+    if options["Score"] == "mcc":
+        value = 16
+        best_time = [
+            x for x in entries
+            if x["Relative-Time"] == 1
+        ]
+        if best_time:
+            value += 2
+        best_memory = [
+            x for x in entries
+            if x["Relative-Memory"] == 1
+        ]
+        if best_memory:
+            value += 2
+        return value
+    if options["Score"] == "time":
+        srt = sorted(entries, key=lambda e: e["Time"])
+        return 20*(1-srt[0]["Time"]/3600000)
+    return None
+
+
 def score_of(data, alg_or_tool, options):
     """
     Computes the score of a tool or an algorithm.
+    With a "Top" option, an algorithm gets for each instance the best score
+    of the tools it ranks in the top ones.
     """
     result = {}
     results = data.results()
+    index = index_for(data, options)
     data.characteristics()
-    examinations = {x["Examination"] for x in results}
-    models = {x["Model"] for x in results}
     tools = {x["Tool"] for x in results}
-    with tqdm(total=len(examinations)*len(models)) as counter:
-        for examination in examinations:
-            for_examination = [
-                x for x in results
-                if x["Examination"] == examination
-            ]
+    predictions = None
+    top = options["Top"] if "Top" in options else 1
+    if alg_or_tool not in tools and not isinstance(alg_or_tool, str):
+        if top > 1:
+            predictions = {
+                key: [tool for tool, _ in ranking[:top]]
+                for key, ranking in rankings_of(
+                    data, alg_or_tool, options,
+                ).items()
+            }
+        else:
+            predictions = {
+                key: [tool]
+                for key, tool in predictions_of(
+                    data, alg_or_tool, options,
+                ).items()
+            }
+    with tqdm(total=sum(len(x) for x in index.values())) as counter:
+        for examination, for_examination in index.items():
             result[examination] = 0
-            for model in models:
-                for_model = [
-                    x for x in for_examination
-                    if x["Model"] is model
-                ]
-                if not for_model:
-                    counter.update(1)
-                    continue
-                if alg_or_tool in tools:
-                    tool = alg_or_tool
-                elif isinstance(alg_or_tool, str):
-                    tool = alg_or_tool
+            for model, for_model in for_examination.items():
+                if predictions is None:
+                    chosen = [alg_or_tool]
                 else:
-                    test = {}
-                    if "Values" in options:
-                        values = options["Values"]
-                    else:
-                        values = Values(None)
-                    test["Examination"] = values.to_learning(examination)
-                    test["Relative-Time"] = values.to_learning(1)  # FIXME
-                    test["Relative-Memory"] = values.to_learning(1)  # FIXME
-                    for key, value in model.items():
-                        if key in options["Forget"]:
-                            test[key] = values.to_learning(None)
-                        elif key not in REMOVE \
-                                and key not in TECHNIQUES:
-                            test[key] = values.to_learning(value)
-                    dataframe = pandas.DataFrame([test])
-                    predicted = alg_or_tool.predict(dataframe)
-                    tool = values.from_learning(predicted[0])
+                    chosen = predictions[examination, model]
                 subscore = []
-                instances = {
-                    x["Instance"] for x in for_model
-                }
-                for instance in instances:
-                    entries = [
-                        x for x in for_model
-                        if x["Instance"] == instance
-                        and x["Tool"] == tool
+                for for_instance in for_model.values():
+                    values = [
+                        instance_score(for_instance.get(tool, []), options)
+                        for tool in chosen
                     ]
-                    if not entries:
-                        subscore.append(0)
-                    elif options["Score"] == "mcc":
-                        value = 16
-                        best_time = [
-                            x for x in entries
-                            if x["Relative-Time"] == 1
-                        ]
-                        if best_time:
-                            value += 2
-                        best_memory = [
-                            x for x in entries
-                            if x["Relative-Memory"] == 1
-                        ]
-                        if best_memory:
-                            value += 2
-                        subscore.append(value)
-                    elif options["Score"] == "time":
-                        srt = sorted(entries, key=lambda e: e["Time"])
-                        value = 20*(1-srt[0]["Time"]/3600000)
-                        subscore.append(value)
+                    values = [x for x in values if x is not None]
+                    if values:
+                        subscore.append(max(values))
                 result[examination] = result[examination] + \
                     math.ceil(statistics.mean(subscore))
                 counter.update(1)
@@ -198,46 +335,23 @@ def max_score(data, options):
     Computes the maximum score.
     """
     result = {}
-    results = data.results()
+    index = index_for(data, options)
     data.characteristics()
-    examinations = {x["Examination"] for x in results}
-    models = {x["Model"] for x in results}
-    with tqdm(total=len(examinations)*len(models)) as counter:
-        for examination in examinations:
-            for_examination = [
-                x for x in results
-                if x["Examination"] == examination
-            ]
+    with tqdm(total=sum(len(x) for x in index.values())) as counter:
+        for examination, for_examination in index.items():
             result[examination] = 0
-            for model in models:
-                for_model = [
-                    x for x in for_examination
-                    if x["Model"] is model
-                ]
-                if not for_model:
-                    counter.update(1)
-                    continue
+            for for_model in for_examination.values():
                 subscore = []
-                instances = {
-                    x["Instance"] for x in for_model
-                }
-                for instance in instances:
-                    entries = [
-                        x for x in for_model
-                        if x["Instance"] == instance
-                    ]
-                    if not entries:
-                        subscore.append(0)
-                    elif options["Score"] == "mcc":
+                for for_instance in for_model.values():
+                    if options["Score"] == "mcc":
                         subscore.append(20)
                     elif options["Score"] == "time":
-                        best = None
-                        for entry in entries:
-                            if best is None:
-                                best = entry
-                            elif entry["Time"] < best["Time"]:
-                                best = entry
-                        value = 20*(1-best["Time"]/3600000)
+                        best = min(
+                            entry["Time"]
+                            for entries in for_instance.values()
+                            for entry in entries
+                        )
+                        value = 20*(1-best/3600000)
                         subscore.append(value)
                 result[examination] = result[examination] + \
                     math.ceil(statistics.mean(subscore))
@@ -245,82 +359,61 @@ def max_score(data, options):
     return result
 
 
-def known(data):
+def known(data, options=None):
     """
     Analyzes known data.
     """
     result = {}
     results = data.results()
+    index = index_for(data, options or {})
     data.characteristics()
-    examinations = {x["Examination"] for x in results}
     tools = {x["Tool"] for x in results}
-    models = {x["Model"] for x in results}
     instances = {x["Instance"] for x in results}
     logging.info(
         f"Analyzing known data."
     )
-    with tqdm(total=len(examinations)*len(instances)) as counter:
-        for examination in examinations:
-            for_examination = [
-                x for x in results
-                if x["Examination"] == examination
-            ]
+    with tqdm(total=len(index)*len(instances)) as counter:
+        for examination, for_examination in index.items():
             result[examination] = {}
             # Extract data for all known instances:
-            for instance in instances:
-                subresults = []
-                for entry in [
-                        x for x in for_examination
-                        if x["Instance"] == instance
-                ]:
-                    subresults.append({
-                        "Time": entry["Time"],
-                        "Memory": entry["Memory"],
-                        "Tool": entry["Tool"],
-                    })
-                result[examination][instance] = sorted(
-                    subresults,
-                    key=lambda e: (e["Time"], e["Memory"], e["Tool"]),
-                )
-                counter.update(1)
-    with tqdm(total=len(examinations)*len(models)) as counter:
-        for examination in examinations:
-            for_examination = [
-                x for x in results
-                if x["Examination"] == examination
-            ]
+            for instance in sorted(instances):
+                result[examination][instance] = []
+            for for_model in for_examination.values():
+                for instance, for_instance in for_model.items():
+                    subresults = []
+                    for entries in for_instance.values():
+                        for entry in entries:
+                            subresults.append({
+                                "Time": entry["Time"],
+                                "Memory": entry["Memory"],
+                                "Tool": entry["Tool"],
+                            })
+                    result[examination][instance] = sorted(
+                        subresults,
+                        key=lambda e: (e["Time"], e["Memory"], e["Tool"]),
+                    )
+            counter.update(len(instances))
+    with tqdm(total=sum(len(x) for x in index.values())) as counter:
+        for examination, for_examination in index.items():
             # Extract data for all known models:
-            for model in models:
-                for_model = [
-                    x for x in for_examination
-                    if x["Model"] is model
-                ]
-                all_instances = {
-                    x["Instance"] for x in for_model
-                }
-                if not all_instances:
-                    counter.update(1)
-                    continue
+            for model, for_model in for_examination.items():
                 tools_results = []
                 for tool in tools:
-                    subresults = [
-                        x for x in for_model
-                        if x["Tool"] == tool
-                    ]
                     count = 0
                     time = 0
                     memory = 0
-                    for subresult in subresults:
-                        count = count + 1
-                        time = time + subresult["Time"]
-                        memory = memory + subresult["Memory"]
+                    for for_instance in for_model.values():
+                        for subresult in for_instance.get(tool, []):
+                            count = count + 1
+                            time = time + subresult["Time"]
+                            memory = memory + subresult["Memory"]
                     tools_results.append({
                         "Count": count,
-                        "Total": len(all_instances),
+                        "Total": len(for_model),
                         "Time": time,
                         "Memory": memory,
                         "Tool": tool,
-                        "Ratio": count / len(all_instances),
+                        "Ratio": count / len(for_model),
                     })
                 tools_results = sorted(
                     tools_results,
@@ -332,140 +425,382 @@ def known(data):
     return result
 
 
+SHARED = None
+
+
+def share(techniques, *shared):
+    """
+    Stores the data shared by all tasks within a worker process.
+    """
+    # pylint: disable=global-statement
+    global SHARED
+    # pylint: enable=global-statement
+    TECHNIQUES[:] = techniques
+    SHARED = shared
+
+
+def learn_shared(name):
+    """
+    Learns using an algorithm and the data shared within a worker process.
+    """
+    return learn(name, *SHARED)
+
+
+def learn(name, data, dataframe, options):
+    """
+    Trains, scores and stores an algorithm.
+    Options contain the values used to encode the dataframe,
+    and the total score used to compute ratios.
+    """
+    total_score = options["Total Score"]
+    seed = options["Seed"] if "Seed" in options else None
+    alg_results = {
+        "Algorithm": name,
+        "Is-Tool": False,
+        "Is-Algorithm": True,
+        "Digest": options["Digest"],
+    }
+    coptions = copy.copy(options)
+    top = coptions.pop("Top", 1)
+    # Reuse the stored algorithm if it was trained on the same data,
+    # and score it only on the examinations whose results have changed:
+    reused = "Trained" in options \
+        and options["Trained"].get(name) == options["Digest"]
+    if reused:
+        logging.info(f"Reusing algorithm: {name}.")
+        directory = options["Directory"]
+        prefix = options["Prefix"]
+        with open(f"{directory}/{prefix}-learned.{name}.p", "rb") as i:
+            algorithm = pickle.load(i)
+    else:
+        logging.info(f"Learning using algorithm: {name}.")
+        algorithm = ALGORITHMS[name](seed)
+        algorithm.fit(dataframe.drop(columns="Tool"), dataframe["Tool"])
+        coptions.pop("Examinations", None)
+    # Compute score:
+    score = score_of(data, algorithm, coptions)
+    total = 0
+    for key, value in score.items():
+        alg_results[key] = value
+        total = total + value
+    ratio = math.ceil(100*total/total_score)
+    logging.info(f"  Score: {total} / {total_score} ({ratio}%)")
+    # Compute the score of the top ranked tools, on all examinations:
+    if top > 1:
+        toptions = copy.copy(coptions)
+        toptions.pop("Examinations", None)
+        toptions["Top"] = top
+        total = sum(score_of(data, algorithm, toptions).values())
+        ratio = math.ceil(100*total/total_score)
+        logging.info(
+            f"  Top {top} score: {total} / {total_score} ({ratio}%)"
+        )
+    # Compute choice:
+    if "Choice" in options and options["Choice"]:
+        choice = choice_of(data, algorithm, coptions)
+        for examination in sorted(choice.keys()):
+            logging.info(f"  In {examination}:")
+            srt = sorted(
+                choice[examination].items(),
+                key=lambda e: e[1],
+                reverse=True
+            )
+            for entry in srt:
+                tool = entry[0]
+                value = entry[1]
+                if value > 0:
+                    logging.info(f"  * {tool} is chosen {value} times")
+    # Store algorithm:
+    if not reused and "Directory" in options and "Prefix" in options:
+        directory = options["Directory"]
+        prefix = options["Prefix"]
+        with open(f"{directory}/{prefix}-learned.{name}.p", "wb") \
+                as output:
+            pickle.dump(algorithm, output)
+    # Output decision tree and random forest to graphviz:
+    if "Output Trees" in options \
+            and options["Output Trees"] \
+            and name in ["decision-tree", "random-forest"]:
+        tree.export_graphviz(
+            algorithm,
+            feature_names=dataframe.drop(columns="Tool").columns,
+            filled=True,
+            rounded=True,
+            special_characters=True
+        )
+    return alg_results
+
+
+def algorithms_of():
+    """
+    Returns the names of the algorithms to use.
+    """
+    return sorted(ALGORITHMS.keys())
+
+
+def best_entries(results, training):
+    """
+    Selects, for each examination and model of the training set,
+    the entries of the tools that solve the most instances.
+    Instances are counted for all examinations, models and tools at once.
+    """
+    kept = {id(model) for model in training}
+    positions = [
+        position for position, entry in enumerate(results)
+        if id(entry["Model"]) in kept
+    ]
+    if not positions:
+        return set()
+    frame = pandas.DataFrame({
+        "Examination": [results[x]["Examination"] for x in positions],
+        "Model": [id(results[x]["Model"]) for x in positions],
+        "Tool": [results[x]["Tool"] for x in positions],
+        "Instance": [results[x]["Instance"] for x in positions],
+    }, index=positions)
+    groups = [frame["Examination"], frame["Model"]]
+    counts = frame.groupby(groups + [frame["Tool"]])["Instance"] \
+        .transform("nunique")
+    maximum = counts.groupby(groups).transform("max")
+    return {
+        results[x] for x in frame.index[counts == maximum]
+        if "Selected" not in results[x]
+    }
+
+
+def training_columns(selected, options):
+    """
+    Returns the columns of the training set, from the selected entries
+    and the characteristics of their models.
+    """
+    def is_feature(key):
+        return key in options["Forget"] \
+            or (key not in REMOVE and key not in TECHNIQUES)
+    keys = {}
+    for entry_keys, model_keys in dict.fromkeys(
+            (tuple(entry), tuple(entry["Model"])) for entry in selected):
+        for key in entry_keys:
+            if is_feature(key):
+                keys.setdefault(key, False)
+        for key in model_keys:
+            if key in options["Forget"] or key not in REMOVE:
+                keys[key] = True
+    return {
+        key: [
+            entry["Model"].get(key) if in_model else entry.get(key)
+            for entry in selected
+        ]
+        for key, in_model in keys.items()
+    }
+
+
 def learned(data, options):
     """
     Analyzes learned data.
     """
-    # Compute maximum score:
-    maxs = max_score(data, options)
+    # Compute maximum score, for all examinations:
+    maxs = max_score(data, {
+        key: value for key, value in options.items()
+        if key != "Examinations"
+    })
     total_score = 0
     for _, subscore in maxs.items():
         total_score += subscore
     # Extract data:
-    result = []
     results = data.results()
     data.characteristics()
-    examinations = {x["Examination"] for x in results}
     models = {x["Model"] for x in results}
     # For each examination and model, select only the good tools:
     logging.info(
         f"Analyzing learned data."
     )
     # Keep only some models into a training and a test set:
-    all_models = list(models)
-    shuffle(all_models)
+    all_models = sorted(models, key=lambda m: m["Id"])
+    if "Seed" in options:
+        Random(options["Seed"]).shuffle(all_models)
+    else:
+        shuffle(all_models)
     training = all_models[:int(len(models)*options["Training"])]
     if not training:
-        training = all_models[0]
+        training = all_models[:1]
     if len(training) != len(models):
         logging.info(
             f"  Keeping only {len(training)} models of {len(models)}."
         )
     # Select entries:
-    selected = set()
-    with tqdm(total=len(examinations)*len(training)) as counter:
-        for examination in examinations:
-            for model in training:
-                subresults = {}
-                maximum = 0
-                for entry in results:
-                    if entry["Examination"] == examination \
-                            and entry["Model"] is model:
-                        tool = entry["Tool"]
-                        if tool not in subresults:
-                            subresults[tool] = set()
-                        subresults[tool].add(entry["Instance"])
-                        maximum = max(maximum, len(subresults[tool]))
-                counter.update(1)
-                for entry in results:
-                    tool = entry["Tool"]
-                    if "Selected" not in entry \
-                            and entry["Examination"] == examination \
-                            and entry["Model"] is model \
-                            and len(subresults[tool]) == maximum:
-                        selected.add(entry)
+    selected = best_entries(results, training)
     # Extract selected entries and convert them to machine learning data:
-    values = Values(None)
-    selection = []
-    with tqdm(total=len(selected)) as counter:
-        for entry in selected:
-            s_entry = {}
-            for key, value in entry.items():
-                if key in options["Forget"]:
-                    s_entry[key] = values.to_learning(None)
-                elif key not in REMOVE \
-                        and key not in TECHNIQUES:
-                    s_entry[key] = values.to_learning(value)
-            for key, value in entry["Model"].items():
-                if key in options["Forget"]:
-                    s_entry[key] = values.to_learning(None)
-                elif key not in REMOVE:
-                    s_entry[key] = values.to_learning(value)
-            selection.append(s_entry)
-            counter.update(1)
-    logging.info(f"Select {len (selection)} best entries of {len(results)}.")
-    # Convert this dict into dataframe:
-    dataframe = pandas.DataFrame(selection)
+    if "Values" in options:
+        values = options["Values"]
+    else:
+        values = Values(None)
+    # Sort entries, as the order of a set changes between runs:
+    selected = sorted(selected, key=lambda e: (
+        e["Examination"], e["Instance"], e["Tool"], e["Year"], e["Id"],
+    ))
+    logging.info(f"Select {len (selected)} best entries of {len(results)}.")
+    # Convert them into an encoded dataframe:
+    encoder = Encoder(values, options["Forget"])
+    dataframe = encoder.fit_transform(
+        pandas.DataFrame(training_columns(selected, options))
+    )
+    values = encoder.values_
     # Remove duplicate entries if required:
     if not options["Duplicates"]:
         dataframe = dataframe.drop_duplicates(keep="first")
         logging.info(f"Using {dataframe.shape [0]} non duplicate entries.")
+    # Store the features used for learning:
+    if "Directory" in options and "Prefix" in options:
+        directory = options["Directory"]
+        prefix = options["Prefix"]
+        with open(f"{directory}/{prefix}-features.json", "w") as output:
+            json.dump(list(dataframe.drop(columns="Tool").columns), output)
+    # Register all values that scoring will need, so that they are known
+    # before the algorithms are trained (possibly in other processes):
+    predictions_inputs(data, values, options)
+    # Store the schema of the encoder of features:
+    if "Directory" in options and "Prefix" in options:
+        with open(f"{directory}/{prefix}-encoder.json", "w") as output:
+            json.dump(dict(
+                encoder.schema(),
+                columns=list(dataframe.drop(columns="Tool").columns),
+            ), output)
+    options = copy.copy(options)
+    options["Digest"] = digest_of(dataframe)
+    options["Values"] = values
+    options["Total Score"] = total_score
     # Compute efficiency for each algorithm:
-    for alg_entry in sorted(ALGORITHMS.items(), key=lambda e: e[0]):
-        name = alg_entry[0]
-        algorithm = alg_entry[1](None)
-        # Skip complex algorithms if duplicates data are allowed:
-        if options["Duplicates"] and name in ["knn", "bagging-knn"]:
-            continue
-        logging.info(f"Learning using algorithm: {name}.")
-        alg_results = {
-            "Algorithm": name,
-            "Is-Tool": False,
-            "Is-Algorithm": True,
-        }
-        algorithm.fit(dataframe.drop("Tool", 1), dataframe["Tool"])
-        coptions = copy.copy(options)
-        coptions["Values"] = values
-        # Compute score:
-        score = score_of(data, algorithm, coptions)
-        total = 0
-        for key, value in score.items():
-            alg_results[key] = value
-            total = total + value
-        ratio = math.ceil(100*total/total_score)
-        logging.info(f"  Score: {total} / {total_score} ({ratio}%)")
-        result.append(alg_results)
-        # Compute choice:
-        if "Choice" in options and options["Choice"]:
-            choice = choice_of(data, algorithm, coptions)
-            for examination in sorted(examinations):
-                logging.info(f"  In {examination}:")
-                srt = sorted(
-                    choice[examination].items(),
-                    key=lambda e: e[1],
-                    reverse=True
-                )
-                for entry in srt:
-                    tool = entry[0]
-                    value = entry[1]
-                    if value > 0:
-                        logging.info(f"  * {tool} is chosen {value} times")
-        # Store algorithm:
-        if "Directory" in options and "Prefix" in options:
-            directory = options["Directory"]
-            prefix = options["Prefix"]
-            with open(f"{directory}/{prefix}-learned.{name}.p", "wb") \
-                    as output:
-                pickle.dump(algorithm, output)
-        # Output decision tree and random forest to graphviz:
-        if "Output Trees" in options \
-                and options["Output Trees"] \
-                and name in ["decision-tree", "random-forest"]:
-            tree.export_graphviz(
+    if "Algorithms" in options:
+        names = options["Algorithms"]
+    else:
+        names = algorithms_of()
+    shared = (data, dataframe, options)
+    if "Jobs" in options and options["Jobs"] > 1:
+        with ProcessPoolExecutor(
+                max_workers=options["Jobs"],
+                initializer=share,
+                initargs=(list(TECHNIQUES), *shared),
+        ) as executor:
+            result = list(executor.map(learn_shared, names))
+    else:
+        result = [learn(name, *shared) for name in names]
+    return result, values
+
+
+def learned_shared(options):
+    """
+    Analyzes learned data shared within a worker process.
+    """
+    return learned(SHARED[0], options)[0]
+
+
+def learned_all(data, tasks, jobs):
+    """
+    Analyzes learned data for each (key, options) task,
+    using up to jobs processes.
+    Yields the key and the result of each task as soon as it is available.
+    """
+    if jobs > 1:
+        with ProcessPoolExecutor(
+                max_workers=jobs,
+                initializer=share,
+                initargs=(list(TECHNIQUES), data),
+        ) as executor:
+            futures = {
+                executor.submit(learned_shared, options): key
+                for key, options in tasks
+            }
+            for future in as_completed(futures):
+                yield futures[future], future.result()
+    else:
+        for key, options in tasks:
+            yield key, learned(data, options)[0]
+
+
+def selector_of(data, learned_data, values, features, options):
+    """
+    Compiles the learned algorithms into a selector bundle,
+    that can be used without pandas nor scikit-learn.
+    Decision trees are flattened into arrays, other algorithms are
+    converted to lookup tables for each examination and known model.
+    The bundle also contains the probabilities used to rank tools.
+    """
+    directory = options["Directory"]
+    prefix = options["Prefix"]
+    keys, tests = predictions_inputs(data, values, options)
+    vectors = tests[features].astype(object).values.tolist() if keys else []
+    examinations = {examination for examination, _ in keys}
+    algorithms = [x for x in learned_data if x["Is-Algorithm"]]
+    priors = {
+        examination: sorted(
+            [
+                [values.to_learning(tool), probability]
+                for tool, probability in for_examination.items()
+            ],
+            key=lambda e: -e[1],
+        )
+        for examination, for_examination in priors_of(data, options).items()
+    }
+    result = {
+        "features": features,
+        "forget": options["Forget"],
+        "values": list(values.items.items()),
+        "best": {
+            examination: sorted(
+                algorithms,
+                key=lambda e, examination=examination: e[examination],
+                reverse=True,
+            )[0]["Algorithm"]
+            for examination in sorted(examinations)
+        },
+        "priors": priors,
+        "algorithms": {},
+    }
+    for entry in algorithms:
+        name = entry["Algorithm"]
+        with open(f"{directory}/{prefix}-learned.{name}.p", "rb") as i:
+            algorithm = pickle.load(i)
+        if hasattr(algorithm, "tree_"):
+            flat = algorithm.tree_
+            probabilities = flat.value[:, 0, :]
+            probabilities = probabilities / probabilities.sum(
+                axis=1, keepdims=True,
+            )
+            result["algorithms"][name] = {"tree": {
+                "left": flat.children_left.tolist(),
+                "right": flat.children_right.tolist(),
+                "feature": flat.feature.tolist(),
+                "threshold": flat.threshold.tolist(),
+                "class": algorithm.classes_.take(
+                    flat.value[:, 0, :].argmax(axis=1)
+                ).tolist(),
+                "classes": algorithm.classes_.tolist(),
+                "probabilities": probabilities.round(6).tolist(),
+            }}
+        elif vectors:
+            rankings = ranking_of(
                 algorithm,
-                feature_names=dataframe.drop("Tool", 1).columns,
-                filled=True,
-                rounded=True,
-                special_characters=True
+                pandas.DataFrame(vectors, columns=features),
+                [
+                    dict(priors.get(examination, []))
+                    for examination, _ in keys
+                ],
             )
-    return result, values
+            predicted = algorithm.predict(
+                pandas.DataFrame(vectors, columns=features)
+            )
+            result["algorithms"][name] = {
+                "table": {
+                    vector_key(vector): int(tool)
+                    for vector, tool in zip(vectors, predicted)
+                },
+                "rankings": {
+                    vector_key(vector): [
+                        [int(tool), round(float(probability), 6)]
+                        for tool, probability in ranking
+                    ]
+                    for vector, ranking in zip(vectors, rankings)
+                },
+            }
+        else:
+            result["algorithms"][name] = {"table": {}, "rankings": {}}
+    return result
@@ -0,0 +1,190 @@
+"""
+Persistent cache of extracted model archives.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import fcntl
+import shutil
+import tarfile
+import tempfile
+import threading
+
+
+def size_of(directory):
+    """
+    Computes the size (in bytes) of the files within a directory.
+    """
+    result = 0
+    for root, _, files in os.walk(directory):
+        for name in files:
+            result += os.path.getsize(os.path.join(root, name))
+    return result
+
+
+class ModelCache:
+    """
+    Extracted archives, keyed by archive path, modification time and size.
+    Extracted trees must be used read-only.
+    The least recently used trees are evicted when the cache is too large.
+    Each process holds a shared lock on the lock file of the trees it uses,
+    and trees are only evicted with an exclusive lock, so that concurrent
+    invocations never evict a tree used by another one.
+    """
+    def __init__(self, directory, maximum):
+        self.directory = os.path.realpath(directory)
+        self.maximum = maximum
+        self.lock = threading.Lock()
+        self.in_use = {}
+        self.claims = {}
+        os.makedirs(self.directory, exist_ok=True)
+
+    def key_of(self, filename):
+        """
+        Computes the key of an archive.
+        """
+        status = os.stat(filename)
+        hasher = hashlib.md5()
+        hasher.update(bytearray(json.dumps([
+            os.path.realpath(filename),
+            status.st_mtime,
+            status.st_size,
+        ]), "utf8"))
+        return hasher.hexdigest()[:16]
+
+    def extract(self, filename):
+        """
+        Returns the directory containing the extracted archive,
+        extracting it if it is not already in the cache.
+        An extracted archive without metadata is incomplete,
+        it is removed and extracted again.
+        """
+        key = self.key_of(filename)
+        target = f"{self.directory}/{key}"
+        metadata = f"{self.directory}/{key}.json"
+        self.claim(key)
+        if os.path.isdir(target) and not os.path.isfile(metadata):
+            logging.warning(f"Removing incomplete cached archive {target}.")
+            shutil.rmtree(target, ignore_errors=True)
+        if os.path.isdir(target):
+            logging.info(f"Using cached archive {filename} in {target}.")
+        else:
+            logging.info(f"Extracting archive {filename} to cache {target}.")
+            temporary = tempfile.mkdtemp(dir=self.directory, prefix=".tmp-")
+            os.chmod(temporary, 0o755)
+            with tarfile.open(name=filename) as tar:
+                tar.extractall(path=temporary)
+            # Write the metadata first, so that an extracted archive
+            # always has its metadata:
+            descriptor, name = tempfile.mkstemp(
+                dir=self.directory, prefix=".tmp-",
+            )
+            with os.fdopen(descriptor, "w") as output:
+                json.dump({
+                    "Archive": os.path.realpath(filename),
+                    "Size": size_of(temporary),
+                }, output)
+            os.replace(name, metadata)
+            try:
+                os.rename(temporary, target)
+            except OSError:
+                # Another process has extracted the same archive:
+                shutil.rmtree(temporary, ignore_errors=True)
+        os.utime(metadata)
+        self.evict()
+        return target
+
+    def lock_of(self, key, operation):
+        """
+        Locks the lock file of an extracted archive, and returns its
+        descriptor, or None if another process holds a conflicting lock
+        and the operation does not block.
+        The lock file is removed on eviction, it is then locked again.
+        """
+        path = f"{self.directory}/{key}.lock"
+        while True:
+            descriptor = os.open(path, os.O_CREAT | os.O_WRONLY, 0o666)
+            try:
+                fcntl.flock(descriptor, operation)
+            except OSError:
+                os.close(descriptor)
+                return None
+            try:
+                if os.stat(path).st_ino == os.fstat(descriptor).st_ino:
+                    return descriptor
+            except FileNotFoundError:
+                pass
+            os.close(descriptor)
+
+    def claim(self, key):
+        """
+        Tells that an extracted archive is used by this process.
+        """
+        with self.lock:
+            if key not in self.claims:
+                self.claims[key] = self.lock_of(key, fcntl.LOCK_SH)
+            self.in_use[key] = self.in_use.get(key, 0) + 1
+
+    def key_in(self, directory):
+        """
+        Returns the key of the extracted archive containing a directory.
+        """
+        relative = os.path.relpath(os.path.realpath(directory), self.directory)
+        return relative.split(os.sep)[0]
+
+    def release(self, directory):
+        """
+        Tells that an extracted archive, or a directory within it,
+        is not used anymore.
+        """
+        key = self.key_in(directory)
+        with self.lock:
+            if self.in_use.get(key, 0) > 1:
+                self.in_use[key] -= 1
+            else:
+                self.in_use.pop(key, None)
+                descriptor = self.claims.pop(key, None)
+                if descriptor is not None:
+                    os.close(descriptor)
+
+    def evict(self):
+        """
+        Removes the least recently used archives,
+        until the cache is smaller than its maximum size.
+        """
+        with self.lock:
+            entries = []
+            for name in os.listdir(self.directory):
+                if not name.endswith(".json"):
+                    continue
+                metadata = f"{self.directory}/{name}"
+                try:
+                    with open(metadata, "r") as i:
+                        size = json.load(i)["Size"]
+                    entries.append(
+                        (os.path.getmtime(metadata), name[:-5], size),
+                    )
+                except FileNotFoundError:
+                    # Another process has evicted it meanwhile:
+                    continue
+            total = sum(size for _, _, size in entries)
+            for _, key, size in sorted(entries):
+                if total <= self.maximum:
+                    break
+                if key in self.in_use:
+                    continue
+                descriptor = self.lock_of(key, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                if descriptor is None:
+                    # Another process uses it:
+                    continue
+                logging.info(f"Evicting cached archive {key}.")
+                try:
+                    os.remove(f"{self.directory}/{key}.json")
+                except FileNotFoundError:
+                    pass
+                shutil.rmtree(f"{self.directory}/{key}", ignore_errors=True)
+                os.remove(f"{self.directory}/{key}.lock")
+                os.close(descriptor)
+                total -= size
@@ -0,0 +1,144 @@
+"""
+Checksummed artifacts generated by the extract command.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import pickle
+import sqlite3
+import urllib.parse
+
+
+def checksum_of(*filenames):
+    """
+    Computes the md5 checksum of a file,
+    or of several files read one after the other.
+    """
+    hasher = hashlib.md5()
+    for filename in filenames:
+        with open(filename, "rb") as hinput:
+            for chunk in iter(lambda i=hinput: i.read(1 << 20), b""):
+                hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+class Artifacts:
+    """
+    Artifacts stored under a prefix, with their checksums in a manifest,
+    so that only missing or modified artifacts are computed again.
+    """
+    def __init__(self, directory, prefix):
+        self.directory = directory
+        self.prefix = prefix
+        self.manifest = {}
+        if os.path.isfile(self.path("manifest.json")):
+            with open(self.path("manifest.json"), "r") as i:
+                self.manifest = json.load(i)
+
+    def path(self, name):
+        """
+        Returns the path of an artifact.
+        """
+        return f"{self.directory}/{self.prefix}-{name}"
+
+    def valid(self, name):
+        """
+        Checks that an artifact exists and has not been modified.
+        """
+        if name not in self.manifest \
+                or not os.path.isfile(self.path(name)):
+            return False
+        if checksum_of(self.path(name)) != self.manifest[name]:
+            logging.warning(f"Artifact {self.path(name)} has been modified.")
+            return False
+        return True
+
+    def store(self, name):
+        """
+        Records the checksum of an artifact that has just been written.
+        """
+        self.manifest[name] = checksum_of(self.path(name))
+        with open(self.path("manifest.json"), "w") as output:
+            json.dump(self.manifest, output, sort_keys=True)
+
+    def load_json(self, name):
+        """
+        Loads a JSON artifact.
+        """
+        logging.info(f"Reusing {self.path(name)}.")
+        with open(self.path(name), "r") as i:
+            return json.load(i)
+
+    def dump_json(self, name, data):
+        """
+        Writes a JSON artifact.
+        """
+        with open(self.path(name), "w") as output:
+            json.dump(data, output)
+        self.store(name)
+
+    def load_pickle(self, name):
+        """
+        Loads a pickled artifact.
+        """
+        logging.info(f"Reusing {self.path(name)}.")
+        with open(self.path(name), "rb") as i:
+            return pickle.load(i)
+
+    def dump_pickle(self, name, data):
+        """
+        Writes a pickled artifact.
+        """
+        with open(self.path(name), "wb") as output:
+            pickle.dump(data, output)
+        self.store(name)
+
+
+def write_known(filename, known_data):
+    """
+    Writes known data to an SQLite database,
+    indexed by examination and instance or model.
+    """
+    if os.path.isfile(filename):
+        os.remove(filename)
+    with sqlite3.connect(filename) as database:
+        database.execute(
+            "CREATE TABLE known ("
+            "examination TEXT, key TEXT, data TEXT, "
+            "PRIMARY KEY (examination, key))"
+        )
+        database.executemany(
+            "INSERT OR REPLACE INTO known VALUES (?, ?, ?)",
+            (
+                (examination, key, json.dumps(data))
+                for examination, subdata in known_data.items()
+                for key, data in subdata.items()
+            ),
+        )
+    database.close()
+
+
+class Known:
+    """
+    Known data read lazily from an SQLite database,
+    so that only the requested entries are loaded.
+    """
+    def __init__(self, filename):
+        # The path is quoted, as it may contain "?", "#" or "%":
+        path = urllib.parse.quote(os.path.abspath(filename))
+        self.database = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+
+    def get(self, examination, key):
+        """
+        Returns known data for an examination and an instance or model,
+        or None if there is none.
+        """
+        row = self.database.execute(
+            "SELECT data FROM known WHERE examination = ? AND key = ?",
+            (examination, key),
+        ).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0])
@@ -0,0 +1,151 @@
+"""
+Column-oriented encoding of model characteristics for machine learning.
+"""
+
+import numpy
+import pandas
+from sklearn.base import BaseEstimator, TransformerMixin
+from mcc4mcc.model import Values
+
+
+class Encoder(TransformerMixin, BaseEstimator):
+    """
+    Encodes the columns of a dataframe using Values,
+    by translating each distinct value of a column only once.
+
+    The values given to the encoder are copied when it is fitted,
+    and values_ contains them with the values of the fitted dataframe.
+    Forgotten columns are translated as None.
+    """
+    def __init__(self, values=None, forget=()):
+        self.values = values
+        self.forget = forget
+
+    def fit(self, dataframe, _=None):
+        """
+        Registers the columns and the values of a dataframe.
+        """
+        self.fit_transform(dataframe)
+        return self
+
+    def fit_transform(self, X, y=None, **fit_params):
+        """
+        Registers the columns and the values of a dataframe,
+        and encodes it.
+        """
+        # pylint: disable=attribute-defined-outside-init
+        if self.values is None:
+            self.values_ = Values(None)
+        else:
+            self.values_ = Values(dict(self.values.items))
+        self.columns_ = list(X.columns)
+        # pylint: enable=attribute-defined-outside-init
+        return encode(X, self.values_, self.forget)
+
+    def transform(self, dataframe):
+        """
+        Encodes a dataframe with the columns registered by fit.
+        Missing columns are translated as None,
+        and unknown values are registered as by Values.to_learning.
+        """
+        return encode(
+            dataframe.reindex(columns=self.columns_),
+            self.values_,
+            self.forget,
+        )
+
+    def schema(self):
+        """
+        Returns the schema of the encoder, that can be stored as JSON.
+        """
+        return {
+            "columns": self.columns_,
+            "forget": list(self.forget),
+            "values": list(self.values_.items.items()),
+        }
+
+
+def encoder_of(schema):
+    """
+    Creates a fitted encoder from a schema returned by Encoder.schema.
+    """
+    encoder = Encoder(forget=schema["forget"])
+    # pylint: disable=attribute-defined-outside-init
+    encoder.values_ = Values(dict(schema["values"]))
+    encoder.columns_ = schema["columns"]
+    # pylint: enable=attribute-defined-outside-init
+    return encoder
+
+
+def encode(dataframe, values, forget=()):
+    """
+    Encodes all columns of a dataframe, registering new values in values.
+    Values are registered in the order of their first occurrence,
+    row by row, so that they get the same numbers as when cells
+    are translated one after the other.
+    """
+    # Keep Python values, such as integers in columns with None:
+    dataframe = dataframe.astype(object)
+    columns = {}
+    pending = []
+    for position, column in enumerate(dataframe.columns):
+        if column in forget:
+            columns[column] = numpy.zeros(len(dataframe), dtype=int)
+            continue
+        codes, categories = pandas.factorize(
+            dataframe[column], use_na_sentinel=True,
+        )
+        categories = list(categories.tolist())
+        if mixes_booleans(categories):
+            # Booleans and numbers would be confused by factorize:
+            codes, categories = exact_factorize(dataframe[column])
+        columns[column] = (codes, categories)
+        # Find the first occurrence of each value:
+        _, first = numpy.unique(codes, return_index=True)
+        for code, row in zip(numpy.unique(codes), first):
+            if code >= 0:
+                pending.append((row, position, categories[code]))
+    # Register new values in the order of their first occurrence:
+    for _, _, value in sorted(pending, key=lambda e: (e[0], e[1])):
+        values.to_learning(value)
+    result = {}
+    for column in dataframe.columns:
+        if column in forget:
+            result[column] = columns[column]
+            continue
+        codes, categories = columns[column]
+        table = numpy.array(
+            [values.to_learning(x) for x in categories] + [0]
+        )
+        result[column] = table[codes]
+    return pandas.DataFrame(result, index=dataframe.index)
+
+
+def mixes_booleans(categories):
+    """
+    Tells if categories contain both Booleans and numbers.
+    """
+    return any(isinstance(x, bool) for x in categories) and any(
+        isinstance(x, (int, float)) and not isinstance(x, bool)
+        for x in categories
+    )
+
+
+def exact_factorize(column):
+    """
+    Factorizes a column using the type of values in addition to their value,
+    so that Booleans are distinct from numbers.
+    """
+    codes = []
+    categories = []
+    known = {}
+    for value in column.tolist():
+        if pandas.isna(value):
+            codes.append(-1)
+            continue
+        key = (type(value), value)
+        if key not in known:
+            known[key] = len(categories)
+            categories.append(value)
+        codes.append(known[key])
+    return numpy.array(codes, dtype=int), categories
@@ -0,0 +1,87 @@
+"""
+Formulas of examinations and answers of tools.
+"""
+
+import os
+import re
+import shutil
+from xml.etree import ElementTree
+
+UNANSWERED = ["CANNOT_COMPUTE", "DO_NOT_COMPETE"]
+
+
+def tag_of(element):
+    """
+    Returns the tag of an XML element, without its namespace.
+    """
+    return element.tag.split("}")[-1]
+
+
+def formulas_of(path, examination):
+    """
+    Returns the identifiers of the formulas of an examination,
+    or None if the examination has no formula file.
+    """
+    filename = f"{path}/{examination}.xml"
+    if not os.path.isfile(filename):
+        return None
+    root = ElementTree.parse(filename).getroot()
+    result = []
+    for element in root.iter():
+        if tag_of(element) == "property":
+            for child in element:
+                if tag_of(child) == "id":
+                    result.append(child.text.strip())
+    return result
+
+
+def result_of(line):
+    """
+    Parses an output line of a tool.
+    Returns the formula (or state space measure) and its value,
+    or None if the line is not a result.
+    """
+    search = re.search(r"^FORMULA\s+(\S+)\s+(\S+)", line)
+    if search is None:
+        search = re.search(r"^STATE_SPACE\s+(\S+)\s+(\S+)", line)
+    if search is None:
+        return None
+    return search.group(1), search.group(2)
+
+
+def answered(lines):
+    """
+    Returns the formulas (or state space measures) answered
+    in the output lines of a tool.
+    """
+    result = set()
+    for line in lines:
+        parsed = result_of(line)
+        if parsed is not None and parsed[1] not in UNANSWERED:
+            result.add(parsed[0])
+    return result
+
+
+def restrict(path, examination, formulas, target):
+    """
+    Copies the model in path to target, keeping only the given formulas
+    in the formula file of the examination.
+    """
+    shutil.copytree(path, target)
+    filename = f"{target}/{examination}.xml"
+    tree = ElementTree.parse(filename)
+    root = tree.getroot()
+    namespace = re.search(r"^\{(.*)\}", root.tag)
+    if namespace is not None:
+        ElementTree.register_namespace("", namespace.group(1))
+    for parent in list(root.iter()):
+        for element in list(parent):
+            if tag_of(element) != "property":
+                continue
+            identifiers = [
+                child.text.strip() for child in element
+                if tag_of(child) == "id"
+            ]
+            if not set(identifiers) & set(formulas):
+                parent.remove(element)
+    tree.write(filename, xml_declaration=True, encoding="utf-8")
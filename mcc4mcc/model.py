@@ -4,11 +4,21 @@ Extract data about models.
 
 import logging
 import csv
+import gzip
+import hashlib
+import io
+import json
+import lzma
+import os
+import pickle
 import re
 import itertools
-import numpy
+import sys
+import tempfile
+from collections.abc import Mapping
 from frozendict import frozendict
 from tqdm import tqdm
+from mcc4mcc.artifacts import checksum_of
 
 CHARACTERISTICS = [
     "Id",
@@ -60,6 +70,13 @@ RESULTS = [
 
 TECHNIQUES = []
 
+# Position of the columns within rows of results:
+POSITIONS = {name: position for position, name in enumerate(RESULTS)}
+
+# Version of the format of parsed data, to change with it,
+# so that parsed data stored in an older format is not loaded:
+PARSED_VERSION = 2
+
 
 def value_of(what):
     """
@@ -96,7 +113,11 @@ class Values:
             self.next_id = -10
         else:
             self.items = items
-            self.next_id = sorted(items.values(), reverse=True)[0]
+            self.next_id = min(-10, min(items.values()) - 1)
+        # Reverse index, keeping the first value of each number:
+        self.reverse = {}
+        for key, value in self.items.items():
+            self.reverse.setdefault(value, key)
 
     def to_learning(self, what):
         """
@@ -107,6 +128,7 @@ class Values:
         if isinstance(what, (bool, str)):
             if what not in self.items:
                 self.items[what] = self.next_id
+                self.reverse.setdefault(self.next_id, what)
                 self.next_id -= 1
             return self.items[what]
         return what
@@ -115,10 +137,143 @@ class Values:
         """
         Translate values from machine learning to their initial value.
         """
-        for key, value in self.items.items():
-            if value == what:
-                return key
-        return None
+        return self.reverse.get(what)
+
+
+class Layout:
+    """
+    Keys of entries of results, shared by all entries with the same keys.
+    Keys that are techniques are stored as bits of a mask,
+    other keys as fields.
+    """
+    __slots__ = ("keys", "positions")
+
+    def __init__(self, keys):
+        self.keys = keys
+        self.positions = {}
+        fields = 0
+        for key in keys:
+            if key in TECHNIQUES:
+                self.positions[key] = ~TECHNIQUES.index(key)
+            else:
+                self.positions[key] = fields
+                fields += 1
+
+
+LAYOUTS = {}
+
+
+class Entry(Mapping):
+    """
+    Compact and immutable entry of results, that can be read
+    as a dictionary.
+    Strings are interned, and Boolean techniques are stored
+    as a bit mask.
+    """
+    __slots__ = ("layout", "fields", "mask", "hashed")
+
+    def __init__(self, layout, fields, mask):
+        self.layout = layout
+        self.fields = fields
+        self.mask = mask
+        self.hashed = None
+
+    def __getitem__(self, key):
+        position = self.layout.positions[key]
+        if position >= 0:
+            return self.fields[position]
+        return bool(self.mask >> ~position & 1)
+
+    def __contains__(self, key):
+        return key in self.layout.positions
+
+    def __iter__(self):
+        return iter(self.layout.keys)
+
+    def __len__(self):
+        return len(self.layout.keys)
+
+    def __eq__(self, other):
+        if isinstance(other, Entry) and other.layout is self.layout:
+            return self.mask == other.mask and self.fields == other.fields
+        return super().__eq__(other)
+
+    def __hash__(self):
+        if self.hashed is None:
+            self.hashed = hash(frozenset(self.items()))
+        return self.hashed
+
+    def __repr__(self):
+        return f"Entry({dict(self)})"
+
+    def __reduce__(self):
+        # The hash is not kept, as it changes between processes:
+        return (Entry, (self.layout, self.fields, self.mask))
+
+
+def entry_of(keys, values):
+    """
+    Creates an entry of results from its keys and values.
+    """
+    keys = tuple(keys)
+    if keys not in LAYOUTS:
+        LAYOUTS[keys] = Layout(keys)
+    layout = LAYOUTS[keys]
+    fields = []
+    mask = 0
+    for key, value in zip(keys, values):
+        position = layout.positions[key]
+        if position < 0:
+            if value:
+                mask |= 1 << ~position
+        elif isinstance(value, str):
+            fields.append(sys.intern(value))
+        else:
+            fields.append(value)
+    return Entry(layout, tuple(fields), mask)
+
+
+def decompressed(raw, filename):
+    """
+    Returns a binary stream that decompresses a .gz, .xz or .zst file
+    on the fly, or the file itself if it is not compressed.
+    """
+    if filename.endswith(".gz"):
+        return gzip.GzipFile(fileobj=raw)
+    if filename.endswith(".xz"):
+        return lzma.LZMAFile(raw)
+    if filename.endswith(".zst"):
+        try:
+            # pylint: disable=import-outside-toplevel
+            import zstandard
+            # pylint: enable=import-outside-toplevel
+        except ImportError as error:
+            raise RuntimeError(
+                f"Reading {filename} requires the zstandard package."
+            ) from error
+        return zstandard.ZstdDecompressor().stream_reader(raw)
+    return raw
+
+
+def rows_of(filename):
+    """
+    Reads the rows of a CSV file in a single pass, skipping the title line.
+    Compressed files are decompressed on the fly,
+    and progress is shown in bytes read from the file.
+    """
+    with open(filename, "rb") as raw, \
+            tqdm(total=os.path.getsize(filename),
+                 unit="B", unit_scale=True) as counter:
+        stream = io.TextIOWrapper(decompressed(raw, filename), newline="")
+        reader = csv.reader(stream)
+        next(reader, None)  # skip the title line
+        position = 0
+        for count, row in enumerate(reader):
+            yield row
+            if count % 4096 == 0:
+                counter.update(raw.tell() - position)
+                position = raw.tell()
+        counter.update(raw.tell() - position)
 
 
 def powerset(iterable):
@@ -132,6 +287,20 @@ def powerset(iterable):
     )
 
 
+def index_of(results):
+    """
+    Groups results as examination -> model -> instance -> tool -> entries,
+    in a single pass over the results.
+    """
+    result = {}
+    for entry in results:
+        by_model = result.setdefault(entry["Examination"], {})
+        by_instance = by_model.setdefault(entry["Model"], {})
+        by_tool = by_instance.setdefault(entry["Instance"], {})
+        by_tool.setdefault(entry["Tool"], []).append(entry)
+    return result
+
+
 class Data:
     """
     Data from the model checking contest.
@@ -146,93 +315,262 @@ class Data:
         """
         if "characteristics" in self.cache:
             return self.cache["characteristics"]
+        if self.parsed() is not None:
+            self.cache["characteristics"] = self.parsed()["characteristics"]
+            return self.cache["characteristics"]
         result = {}
         source = self.configuration["characteristics"]
         logging.info(
             f"Reading model characteristics from {source}."
         )
-        with tqdm(total=sum(1 for line in open(source)) - 1) as counter:
-            with open(source) as data:
-                data.readline()  # skip the title line
-                reader = csv.reader(data)
-                for row in reader:
-                    entry = {}
-                    for i, characteristic in enumerate(CHARACTERISTICS):
-                        entry[characteristic] = value_of(row[i])
-                    entry["Place/Transition"] = True if re.search(
-                        "PT", entry["Type"]) else False
-                    entry["Colored"] = True if re.search(
-                        "COLORED", entry["Type"]) else False
-                    identifier = entry["Id"]
-                    del entry["Type"]
-                    del entry["Fixed size"]
-                    del entry["Origin"]
-                    del entry["Submitter"]
-                    del entry["Year"]
-                    result[identifier] = frozendict(entry)
-                    counter.update(1)
+        for row in rows_of(source):
+            entry = {}
+            for i, characteristic in enumerate(CHARACTERISTICS):
+                entry[characteristic] = value_of(row[i])
+            entry["Place/Transition"] = True if re.search(
+                "PT", entry["Type"]) else False
+            entry["Colored"] = True if re.search(
+                "COLORED", entry["Type"]) else False
+            identifier = entry["Id"]
+            del entry["Type"]
+            del entry["Fixed size"]
+            del entry["Origin"]
+            del entry["Submitter"]
+            del entry["Year"]
+            result[identifier] = frozendict(entry)
         self.cache["characteristics"] = result
         return result
 
+    def sources(self):
+        """
+        Returns the files of results, by decreasing priority.
+        """
+        sources = self.configuration["results"]
+        if isinstance(sources, str):
+            return [sources]
+        return list(sources)
+
+    def row_entry(self, row, found, keys):
+        """
+        Converts a row of results to an entry, or returns None if the row
+        is filtered out, invalid, or already found in a file of higher
+        priority. The key of a valid row, with the renamed tool,
+        is added to keys, so that invalid rows never hide valid ones
+        of files of lower priority.
+        """
+        characteristics = self.cache["characteristics"]
+        # Filter the row before converting all its values:
+        if self.configuration["year"] \
+                and value_of(row[POSITIONS["Year"]]) \
+                != self.configuration["year"]:
+            return None
+        if value_of(row[POSITIONS["Tool"]]) in self.configuration["exclude"]:
+            return None
+        tool = value_of(row[POSITIONS["Tool"]])
+        key = (
+            self.configuration["renaming"].get(tool, tool),
+            re.sub(r"^S_", "", value_of(row[POSITIONS["Instance"]])),
+            value_of(row[POSITIONS["Examination"]]),
+        )
+        if key in found:
+            return None
+        entry = {}
+        for i, rentry in enumerate(RESULTS):
+            entry[rentry] = value_of(row[i])
+        if not entry["Time OK"] \
+                or not entry["Memory OK"] \
+                or entry["Status"] != "normal" \
+                or entry["Results"] in ["DNC", "DNF", "CC"]:
+            return None
+        keys.add(key)
+        for technique in re.findall(
+                r"([A-Z_]+)",
+                entry["Techniques"]
+        ):
+            if technique not in TECHNIQUES:
+                TECHNIQUES.append(technique)
+            entry[technique] = True
+        entry["Surprise"] = True if re.search(
+            r"^S_", entry["Instance"]) else False
+        if entry["Surprise"]:
+            entry["Instance"] = re.search(
+                r"^S_(.*)$", entry["Instance"]).group(1)
+        split = re.search(
+            r"([^-]+)\-([^-]+)\-([^-]+)$", entry["Instance"])
+        model_id = split.group(1)
+        entry["Model"] = characteristics[model_id]
+        entry["Time"] = entry["Clock Time"]
+        del entry["Time OK"]
+        del entry["Memory OK"]
+        del entry["CPU Time"]
+        del entry["Clock Time"]
+        del entry["IO Time"]
+        del entry["Cores"]
+        del entry["Results"]
+        del entry["Status"]
+        del entry["Techniques"]
+        return entry
+
     def results(self):
         """
         Reads the results of the model checking contest.
+        When several files are given, the results of a tool
+        for an instance and examination are read from the first file
+        that contains a valid result for them.
         """
         if "results" in self.cache:
             return self.cache["results"]
+        result = self.load_parsed()
+        if result is None:
+            if "columnar" in self.configuration \
+                    and self.configuration["columnar"]:
+                result = [
+                    entry_of(x.keys(), x.values())
+                    for x in self.dataframe().to_dict("records")
+                ]
+                # Entries are the only copy of results that is kept,
+                # as data is sent to the workers of training:
+                self.cache.pop("dataframe", None)
+            else:
+                result = self.parse()
+            self.store_parsed(result)
+        self.cache["results"] = result
+        self.cache["index"] = index_of(result)
+        # Parsed data is not needed anymore:
+        self.cache.pop("parsed", None)
+        return result
+
+    def checksums(self):
+        """
+        Returns the checksums of the characteristics file
+        and of the files of results, computed only once.
+        """
+        if "checksums" not in self.cache:
+            self.cache["checksums"] = {
+                "characteristics": checksum_of(
+                    self.configuration["characteristics"]
+                ),
+                "results": checksum_of(*self.sources()),
+            }
+        return self.cache["checksums"]
+
+    def parsed_path(self):
+        """
+        Returns the file of the parsed data in the cache, or None
+        if there is no cache.
+        Its name depends on the contents of the files
+        and the configuration used to read them.
+        """
+        if "parsed" not in self.configuration \
+                or self.configuration["parsed"] is None:
+            return None
+        if "parsed-path" in self.cache:
+            return self.cache["parsed-path"]
+        hasher = hashlib.md5()
+        hasher.update(bytearray(json.dumps({
+            "version": PARSED_VERSION,
+            "checksums": self.checksums(),
+            "sources": len(self.sources()),
+            "year": self.configuration["year"],
+            "exclude": sorted(self.configuration["exclude"]),
+            "renaming": self.configuration["renaming"],
+        }, sort_keys=True), "utf8"))
+        directory = self.configuration["parsed"]
+        path = f"{directory}/{hasher.hexdigest()}.p"
+        self.cache["parsed-path"] = path
+        return path
+
+    def parsed(self):
+        """
+        Loads the parsed characteristics and results from the cache,
+        or returns None if they are not cached.
+        """
+        if "parsed" in self.cache:
+            return self.cache["parsed"]
+        path = self.parsed_path()
+        self.cache["parsed"] = None
+        if path is not None and os.path.isfile(path):
+            logging.info(f"Reading parsed data from {path}.")
+            with open(path, "rb") as i:
+                self.cache["parsed"] = pickle.load(i)
+        return self.cache["parsed"]
+
+    def load_parsed(self):
+        """
+        Returns the parsed results from the cache, or None
+        if they are not cached.
+        """
+        parsed = self.parsed()
+        if parsed is None:
+            return None
+        for technique in parsed["techniques"]:
+            if technique not in TECHNIQUES:
+                TECHNIQUES.append(technique)
+        characteristics = self.characteristics()
+        columns = dict(parsed["columns"])
+        if "Model" in columns:
+            columns["Model"] = [
+                characteristics[x] for x in columns["Model"]
+            ]
+        keys = parsed["keys"]
+        return [
+            entry_of(keys[order], (columns[key][row] for key in keys[order]))
+            for row, order in enumerate(parsed["order"])
+        ]
+
+    def store_parsed(self, result):
+        """
+        Stores the characteristics and the parsed results in the cache.
+        Results are stored by column, with the order of keys of each entry.
+        """
+        path = self.parsed_path()
+        if path is None:
+            return
+        keys = {}
+        order = [keys.setdefault(tuple(x), len(keys)) for x in result]
+        columns = {
+            key: [x.get(key) for x in result]
+            for key in dict.fromkeys(
+                key for entry_keys in keys for key in entry_keys
+            )
+        }
+        if "Model" in columns:
+            columns["Model"] = [x["Id"] for x in columns["Model"]]
+        os.makedirs(self.configuration["parsed"], exist_ok=True)
+        with tempfile.NamedTemporaryFile(
+                dir=self.configuration["parsed"], delete=False) as output:
+            pickle.dump({
+                "characteristics": self.characteristics(),
+                "techniques": list(TECHNIQUES),
+                "keys": list(keys),
+                "order": order,
+                "columns": columns,
+            }, output, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(output.name, path)
+        logging.info(f"Stored parsed data in {path}.")
+
+    def parse(self):
+        """
+        Parses the files of results.
+        """
+        # Heavy modules are imported only when needed,
+        # to keep the run command fast to start:
+        # pylint: disable=import-outside-toplevel
+        import numpy
+        # pylint: enable=import-outside-toplevel
         result = []
-        source = self.configuration["results"]
-        characteristics = self.cache["characteristics"]
+        sources = self.sources()
         logging.info(
-            f"Reading mcc results from {source}."
+            f"Reading mcc results from {', '.join(sources)}."
         )
-        with tqdm(total=sum(1 for line in open(source)) - 1) as counter:
-            with open(source) as data:
-                data.readline()  # skip the title line
-                reader = csv.reader(data)
-                for row in reader:
-                    entry = {}
-                    for i, rentry in enumerate(RESULTS):
-                        entry[rentry] = value_of(row[i])
-                    if self.configuration["year"] \
-                            and entry["Year"] != self.configuration["year"]:
-                        counter.update(1)
-                        continue
-                    if entry["Tool"] in self.configuration["exclude"]:
-                        counter.update(1)
-                        continue
-                    if entry["Time OK"] \
-                            and entry["Memory OK"] \
-                            and entry["Status"] == "normal" \
-                            and entry["Results"] not in ["DNC", "DNF", "CC"]:
-                        for technique in re.findall(
-                                r"([A-Z_]+)",
-                                entry["Techniques"]
-                        ):
-                            if technique not in TECHNIQUES:
-                                TECHNIQUES.append(technique)
-                            entry[technique] = True
-                        entry["Surprise"] = True if re.search(
-                            r"^S_", entry["Instance"]) else False
-                        if entry["Surprise"]:
-                            entry["Instance"] = re.search(
-                                r"^S_(.*)$", entry["Instance"]).group(1)
-                        split = re.search(
-                            r"([^-]+)\-([^-]+)\-([^-]+)$", entry["Instance"])
-                        model_id = split.group(1)
-                        entry["Model"] = characteristics[model_id]
-                        entry["Time"] = entry["Clock Time"]
-                        del entry["Time OK"]
-                        del entry["Memory OK"]
-                        del entry["CPU Time"]
-                        del entry["Clock Time"]
-                        del entry["IO Time"]
-                        del entry["Cores"]
-                        del entry["Results"]
-                        del entry["Status"]
-                        del entry["Techniques"]
-                        result.append(entry)
-                    counter.update(1)
+        found = set()
+        for source in sources:
+            keys = set()
+            for row in rows_of(source):
+                entry = self.row_entry(row, found, keys)
+                if entry is not None:
+                    result.append(entry)
+            found |= keys
         # Set techniques to False if they do not appear within an entry:
         with tqdm(total=len(result)) as counter:
             for entry in result:
@@ -298,10 +636,113 @@ class Data:
                     numpy.finfo("float32").max,
                 )
                 counter.update(1)
-        # Convert to fronzendict:
-        result = [frozendict(x) for x in result]
-        self.cache["results"] = result
-        return result
+        # Convert to compact entries:
+        return [entry_of(x.keys(), x.values()) for x in result]
+
+    def dataframe(self):
+        """
+        Reads the results of the model checking contest as a dataframe,
+        using vectorized operations instead of one dictionary per row.
+        """
+        if "dataframe" in self.cache:
+            return self.cache["dataframe"]
+        # pylint: disable=import-outside-toplevel
+        import numpy
+        import pandas
+        # pylint: enable=import-outside-toplevel
+        sources = self.sources()
+        characteristics = self.characteristics()
+        logging.info(
+            f"Reading mcc results from {', '.join(sources)} as a dataframe."
+        )
+        # Read files by chunks, that are filtered before being kept,
+        # and decompressed on the fly by pandas:
+        chunks = []
+        for priority, source in enumerate(sources):
+            for chunk in pandas.read_csv(
+                    source,
+                    names=RESULTS,
+                    header=0,
+                    usecols=range(len(RESULTS)),
+                    dtype=str,
+                    keep_default_na=False,
+                    chunksize=1 << 16,
+            ):
+                if self.configuration["year"]:
+                    chunk = chunk[
+                        pandas.to_numeric(chunk["Year"])
+                        == self.configuration["year"]
+                    ]
+                chunk = chunk[
+                    ~chunk["Tool"].isin(self.configuration["exclude"])
+                ]
+                chunks.append(chunk.assign(Source=priority))
+        if not chunks:
+            chunks.append(
+                pandas.DataFrame(columns=RESULTS, dtype=str).assign(Source=0)
+            )
+        frame = pandas.concat(chunks, ignore_index=True)
+        for column in ["Year", "Memory", "Clock Time", "Id"]:
+            frame[column] = pandas.to_numeric(frame[column])
+        # Keep only valid results:
+        valid = frame["Status"] == "normal"
+        valid &= ~frame["Results"].isin(["DNC", "DNF", "CC"])
+        for column in ["Time OK", "Memory OK"]:
+            truth = {x: bool(value_of(x)) for x in frame[column].unique()}
+            valid &= frame[column].map(truth).astype(bool)
+        frame = frame[valid]
+        # Keep results from the file of highest priority,
+        # for tools with the same name once renamed:
+        first = frame.groupby([
+            frame["Tool"].replace(self.configuration["renaming"]),
+            frame["Instance"].str.replace(r"^S_", "", regex=True),
+            frame["Examination"],
+        ])["Source"].transform("min")
+        frame = frame[frame["Source"] == first].reset_index(drop=True)
+        # Expand techniques into Boolean columns:
+        techniques = frame["Techniques"].str.findall(r"([A-Z_]+)").explode()
+        techniques = techniques.dropna()
+        for technique in techniques.unique():
+            if technique not in TECHNIQUES:
+                TECHNIQUES.append(technique)
+        flags = pandas.crosstab(techniques.index, techniques) \
+            .reindex(index=frame.index, columns=TECHNIQUES, fill_value=0) \
+            .astype(bool)
+        # Handle surprise models and link instances to models:
+        frame["Surprise"] = frame["Instance"].str.startswith("S_")
+        frame["Instance"] = frame["Instance"].str.replace(
+            r"^S_", "", regex=True)
+        model_ids = frame["Instance"].str.extract(
+            r"([^-]+)\-([^-]+)\-([^-]+)$")[0]
+        frame["Model"] = [characteristics[x] for x in model_ids]
+        frame["Time"] = frame["Clock Time"]
+        frame["Tool"] = frame["Tool"].replace(self.configuration["renaming"])
+        # Compute relative time and memory of tools,
+        # for each examination and instance:
+        groups = [frame["Examination"], frame["Instance"]]
+        for column in ["Time", "Memory"]:
+            positive = frame[column].where(frame[column] != 0, 1)
+            best = positive.groupby(groups).transform("min")
+            frame[f"Relative-{column}"] = (frame[column] / best).clip(
+                upper=numpy.finfo("float32").max,
+            )
+        frame = pandas.concat([
+            frame[["Year", "Tool", "Instance", "Examination", "Memory", "Id"]],
+            flags,
+            frame[[
+                "Surprise", "Model", "Time",
+                "Relative-Time", "Relative-Memory",
+            ]],
+        ], axis=1)
+        self.cache["dataframe"] = frame
+        return frame
+
+    def index(self):
+        """
+        Returns the results grouped by examination, model, instance and tool.
+        """
+        self.results()
+        return self.cache["index"]
 
     def filter(self, predicate):
         """
@@ -312,3 +753,4 @@ class Data:
             x for x in self.cache["results"]
             if predicate(x)
         ]
+        self.cache["index"] = index_of(self.cache["results"])
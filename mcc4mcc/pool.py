@@ -0,0 +1,307 @@
+"""
+Pool of idle tool containers, that run jobs using exec.
+"""
+
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import queue
+import shutil
+import tempfile
+import threading
+import docker
+
+LABEL = "mcc4mcc.pool"
+
+
+class PooledRun:
+    """
+    Run of a tool within a pooled container,
+    with the same interface as a container.
+    """
+    def __init__(self, pool, key, container, directory, environment):
+        self.pool = pool
+        self.key = key
+        self.container = container
+        self.directory = directory
+        self.killed = False
+        self.released = False
+        self.buffer = []
+        self.lines = queue.Queue()
+        self.done = threading.Event()
+        api = pool.client.api
+        self.exec_id = api.exec_create(
+            container.id,
+            "mcc-head",
+            stdout=True,
+            stderr=True,
+            workdir=directory,
+            environment=environment,
+        )["Id"]
+        output = api.exec_start(self.exec_id, stream=True)
+        threading.Thread(
+            target=self.read,
+            args=(output,),
+            daemon=True,
+        ).start()
+
+    def read(self, output):
+        """
+        Reads the output of the tool, line by line.
+        """
+        pending = b""
+        try:
+            for chunk in output:
+                pending += chunk
+                *lines, pending = pending.split(b"\n")
+                for line in lines:
+                    self.buffer.append(line)
+                    self.lines.put(line)
+        except (OSError, docker.errors.APIError):
+            pass
+        finally:
+            if pending:
+                self.buffer.append(pending)
+                self.lines.put(pending)
+            self.lines.put(None)
+            self.done.set()
+
+    def logs(self, stream=False):
+        """
+        Returns the output of the tool, as a stream of lines if required.
+        """
+        if stream:
+            return iter(self.lines.get, None)
+        self.done.wait()
+        return b"\n".join(self.buffer)
+
+    def wait(self):
+        """
+        Waits for the end of the tool, and gives back the container
+        to the pool.
+        """
+        self.done.wait()
+        code = None
+        if not self.killed:
+            code = self.pool.client.api.exec_inspect(self.exec_id)["ExitCode"]
+        if code is None:
+            code = 137
+        if not self.killed and not self.released:
+            self.released = True
+            self.pool.release(self.key, self.container)
+        return {"StatusCode": code}
+
+    def kill(self):
+        """
+        Kills the tool, with its container as exec cannot be killed.
+        """
+        self.killed = True
+        self.pool.discard(self.container)
+
+    def stats(self, stream=False):
+        """
+        Returns the statistics of the container.
+        """
+        return self.container.stats(stream=stream)
+
+    def remove(self, force=False):
+        """
+        Removes the job directory of the tool.
+        """
+        if force and not self.done.is_set():
+            self.kill()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+class ContainerPool:
+    """
+    Containers of tools, started once and kept idle between jobs.
+
+    Jobs are run in directories created within the pool directory,
+    that is mounted at the same path within containers.
+    Extra directories, such as the cache of extracted models,
+    are mounted read-only at the same path, so that models within them
+    are linked instead of copied.
+    Persistent pools keep their containers after use,
+    so that they are reused by the next invocations.
+    Each process claims the containers it uses, with a lock on a file
+    of the pool directory, so that concurrent invocations never share
+    a container. Locks are released when the process ends.
+    """
+    def __init__(self, client, directory, mounts=(), persistent=False):
+        self.client = client
+        self.directory = os.path.realpath(directory)
+        self.mounts = [os.path.realpath(x) for x in mounts]
+        self.persistent = persistent
+        self.lock = threading.Lock()
+        self.idle = {}
+        self.used = {}
+        self.claims = {}
+        os.makedirs(self.directory, exist_ok=True)
+
+    def key_of(self, tool, limits):
+        """
+        Computes the key of the containers of a tool with some limits.
+        """
+        hasher = hashlib.md5()
+        hasher.update(bytearray(json.dumps([
+            tool.lower(),
+            self.directory,
+            self.mounts,
+            limits,
+        ], sort_keys=True), "utf8"))
+        return hasher.hexdigest()[:16]
+
+    def acquire(self, tool, limits):
+        """
+        Returns an idle container for a tool,
+        starting it if there is none.
+        """
+        key = self.key_of(tool, limits)
+        with self.lock:
+            if self.idle.get(key):
+                container = self.idle[key].pop()
+                self.used[container.id] = container
+                return key, container
+        if self.persistent:
+            for container in self.client.containers.list(
+                    filters={"label": f"{LABEL}={key}"}):
+                with self.lock:
+                    if container.id in self.claims:
+                        continue
+                if self.claim(container):
+                    return key, container
+        while True:
+            container = self.start(tool, limits, key)
+            # Another process may have claimed it meanwhile:
+            if self.claim(container):
+                return key, container
+
+    def start(self, tool, limits, key):
+        """
+        Starts an idle container for a tool.
+        """
+        logging.info(f"Starting pooled container for {tool}.")
+        volumes = {
+            self.directory: {
+                "bind": self.directory,
+                "mode": "rw",
+            },
+        }
+        for mount in self.mounts:
+            volumes[mount] = {
+                "bind": mount,
+                "mode": "ro",
+            }
+        return self.client.containers.run(
+            image=f"mccpetrinets/{tool.lower()}",
+            entrypoint=["tail", "-f", "/dev/null"],
+            detach=True,
+            labels={LABEL: key},
+            volumes=volumes,
+            **limits,
+        )
+
+    def claim(self, container):
+        """
+        Claims a container for this process, and marks it as used.
+        Returns False if another process has already claimed it.
+        """
+        descriptor = os.open(
+            f"{self.directory}/{container.id}.lock",
+            os.O_CREAT | os.O_WRONLY,
+            0o666,
+        )
+        try:
+            fcntl.flock(descriptor, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(descriptor)
+            return False
+        with self.lock:
+            self.claims[container.id] = descriptor
+            self.used[container.id] = container
+        return True
+
+    def unclaim(self, container):
+        """
+        Releases the claim of this process on a removed container.
+        """
+        with self.lock:
+            descriptor = self.claims.pop(container.id, None)
+        if descriptor is None:
+            return
+        try:
+            os.remove(f"{self.directory}/{container.id}.lock")
+        except FileNotFoundError:
+            pass
+        os.close(descriptor)
+
+    def release(self, key, container):
+        """
+        Gives back an idle container to the pool.
+        """
+        with self.lock:
+            self.used.pop(container.id, None)
+            self.idle.setdefault(key, []).append(container)
+
+    def discard(self, container):
+        """
+        Removes a container from the pool.
+        """
+        with self.lock:
+            self.used.pop(container.id, None)
+        try:
+            container.remove(force=True)
+        except docker.errors.APIError:
+            pass
+        self.unclaim(container)
+
+    def run(self, run):
+        """
+        Runs a tool on the model in path, within a pooled container.
+        The run gives the tool, examination, instance, path, limits
+        and confinement.
+        """
+        tool = run["Tool"]
+        path = run["Path"]
+        key, container = self.acquire(tool, run["Limits"])
+        directory = tempfile.mkdtemp(dir=self.directory, prefix="job-")
+        os.chmod(directory, 0o777)
+        linked = any(path.startswith(f"{x}/") for x in self.mounts)
+        for name in os.listdir(path):
+            if linked:
+                os.symlink(f"{path}/{name}", f"{directory}/{name}")
+            elif os.path.isdir(f"{path}/{name}"):
+                shutil.copytree(f"{path}/{name}", f"{directory}/{name}")
+            else:
+                shutil.copy2(f"{path}/{name}", f"{directory}/{name}")
+        return PooledRun(self, key, container, directory, {
+            "BK_LOG_FILE": f"{directory}/log",
+            "BK_EXAMINATION": f"{run['Examination']}",
+            "BK_TIME_CONFINEMENT": f"{run['Confinement']}",
+            "BK_INPUT": f"{run['Instance']}",
+            "BK_TOOL": tool.lower(),
+        })
+
+    def close(self):
+        """
+        Removes the containers of the pool, unless it is persistent.
+        """
+        if self.persistent:
+            return
+        with self.lock:
+            containers = list(self.used.values()) + [
+                container
+                for containers in self.idle.values()
+                for container in containers
+            ]
+            self.used = {}
+            self.idle = {}
+        for container in containers:
+            try:
+                container.remove(force=True)
+            except docker.errors.APIError:
+                pass
+            self.unclaim(container)
@@ -0,0 +1,68 @@
+"""
+Allocation of the time budget of an examination to successive tools.
+"""
+
+import statistics
+import time
+
+
+def expected_time(entry):
+    """
+    Returns the expected time (in seconds) of a tool, from an entry
+    of known data for an instance or a model, or None if it is unknown.
+    """
+    if entry.get("Time") is None:
+        return None
+    if "Count" in entry:
+        if not entry["Count"]:
+            return None
+        return entry["Time"] / entry["Count"] / 1000
+    return entry["Time"] / 1000
+
+
+class Scheduler:
+    """
+    Splits the remaining time between the tools that are still to run,
+    in proportion of their known running times.
+    The budget is counted from start (a time.monotonic timestamp),
+    or from the creation of the scheduler if it is not given.
+    """
+    def __init__(self, budget, minimum, known_tools, start=None):
+        self.start = time.monotonic() if start is None else start
+        self.budget = budget
+        self.minimum = minimum
+        self.expected = {}
+        for entry in known_tools or []:
+            expected = expected_time(entry)
+            if expected is not None and entry["Tool"] not in self.expected:
+                self.expected[entry["Tool"]] = max(expected, 1)
+
+    def remaining(self):
+        """
+        Returns the remaining time (in seconds).
+        """
+        return self.budget - (time.monotonic() - self.start)
+
+    def weight(self, tool):
+        """
+        Returns the weight of a tool, that is its expected time,
+        or the mean expected time if it is unknown.
+        """
+        if tool in self.expected:
+            return self.expected[tool]
+        if self.expected:
+            return statistics.mean(self.expected.values())
+        return 1
+
+    def slice_of(self, tool, tools):
+        """
+        Returns the time (in seconds) allocated to a tool,
+        given the tools that are still to run (including this one),
+        or None if the remaining time is too small to be useful.
+        """
+        remaining = self.remaining()
+        if remaining < self.minimum:
+            return None
+        total = sum(self.weight(x) for x in tools)
+        share = remaining * self.weight(tool) / total
+        return int(min(remaining, max(self.minimum, share)))
@@ -0,0 +1,119 @@
+"""
+Fast tool selection from a precompiled selector bundle.
+
+This module is used by the run command, and must not import
+heavy modules such as pandas or scikit-learn.
+"""
+
+import json
+from mcc4mcc.model import Values
+
+
+def vector_key(vector):
+    """
+    Converts a feature vector to a key of a lookup table.
+    """
+    return ",".join(str(x) for x in vector)
+
+
+class Selector:
+    """
+    Tool selector loaded from a <prefix>-selector.json bundle.
+
+    The bundle contains, for each algorithm,
+    either a flattened decision tree that can predict for any model,
+    or a lookup table of predictions for each examination and known model.
+    """
+    def __init__(self, filename):
+        with open(filename, "r") as i:
+            bundle = json.load(i)
+        self.features = bundle["features"]
+        self.forget = bundle["forget"]
+        self.best = bundle["best"]
+        self.priors = bundle.get("priors", {})
+        self.algorithms = bundle["algorithms"]
+        self.values = Values(dict(bundle["values"]))
+
+    def algorithm(self, examination):
+        """
+        Returns the best algorithm for an examination.
+        """
+        return self.best[examination]
+
+    def vector(self, characteristics):
+        """
+        Encodes characteristics as a feature vector.
+        """
+        return [
+            self.values.to_learning(None) if feature in self.forget
+            else self.values.to_learning(characteristics.get(feature))
+            for feature in self.features
+        ]
+
+    def leaf(self, tree, vector):
+        """
+        Returns the leaf of a flattened decision tree for a feature vector.
+        """
+        node = 0
+        while tree["left"][node] != -1:
+            if vector[tree["feature"][node]] <= tree["threshold"][node]:
+                node = tree["left"][node]
+            else:
+                node = tree["right"][node]
+        return node
+
+    def prior(self, examination):
+        """
+        Returns the probabilities of tools to be good ones
+        for an examination, as learning values, from known data.
+        """
+        return dict(self.priors.get(examination, []))
+
+    def select(self, algorithm, characteristics):
+        """
+        Selects a tool using an algorithm, or returns None if the bundle
+        cannot predict for these characteristics.
+        """
+        selector = self.algorithms[algorithm]
+        vector = self.vector(characteristics)
+        if "tree" in selector:
+            tree = selector["tree"]
+            predicted = tree["class"][self.leaf(tree, vector)]
+        else:
+            predicted = selector["table"].get(vector_key(vector))
+            if predicted is None:
+                return None
+        return self.values.from_learning(predicted)
+
+    def rank(self, algorithm, characteristics):
+        """
+        Ranks the tools using an algorithm, from the most to the least
+        probable one, as a list of (tool, probability),
+        or returns None if the bundle cannot rank for these characteristics.
+        """
+        selector = self.algorithms[algorithm]
+        vector = self.vector(characteristics)
+        if "tree" in selector and "probabilities" in selector["tree"]:
+            tree = selector["tree"]
+            ranking = sorted(
+                [
+                    [tool, probability]
+                    for tool, probability in zip(
+                        tree["classes"],
+                        tree["probabilities"][self.leaf(tree, vector)],
+                    )
+                    if probability > 0
+                ],
+                key=lambda e: -e[1],
+            )
+        elif "rankings" in selector:
+            ranking = selector["rankings"].get(vector_key(vector))
+        else:
+            ranking = None
+        if ranking is None:
+            tool = self.select(algorithm, characteristics)
+            return None if tool is None else [(tool, 1)]
+        return [
+            (self.values.from_learning(tool), probability)
+            for tool, probability in ranking
+        ]
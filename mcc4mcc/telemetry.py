@@ -0,0 +1,213 @@
+"""
+Resources used by tool containers, recorded in the results.csv format.
+"""
+
+import csv
+import datetime
+import math
+import os
+import re
+import threading
+import time
+from mcc4mcc.formulas import UNANSWERED, result_of
+from mcc4mcc.model import RESULTS
+
+
+class Telemetry:
+    """
+    Samples the docker statistics of a container while a tool runs,
+    to measure its peak memory, CPU time and clock time.
+
+    Statistics are sampled as soon as the tool starts, at each interval,
+    and once more when it stops, so that short runs are measured too.
+    Containers of a pool have already run other jobs, so their CPU time
+    is measured from the first sample, and their memory from the current
+    usage only, as the peak usage of a container covers all its jobs.
+    """
+    def __init__(self, container, pooled=False, interval=1):
+        self.container = container
+        self.pooled = pooled
+        self.interval = interval
+        self.start = time.monotonic()
+        self.end = None
+        self.memory = 0
+        self.first = None if pooled else 0
+        self.last = 0
+        self.done = threading.Event()
+        self.thread = threading.Thread(target=self.sample, daemon=True)
+        self.thread.start()
+
+    def measure(self):
+        """
+        Takes a sample of the statistics of the container.
+        Returns False if they are not available anymore.
+        """
+        # pylint: disable=import-outside-toplevel
+        import docker
+        # pylint: enable=import-outside-toplevel
+        try:
+            stats = self.container.stats(stream=False)
+        except docker.errors.APIError:
+            return False
+        memory = stats.get("memory_stats", {})
+        usage = memory.get("usage", 0)
+        if not self.pooled:
+            usage = max(usage, memory.get("max_usage", 0))
+        self.memory = max(self.memory, usage)
+        cpu = stats.get("cpu_stats", {}).get("cpu_usage", {})
+        if "total_usage" not in cpu:
+            return True
+        if self.first is None:
+            previous = stats.get("precpu_stats", {}).get("cpu_usage", {})
+            self.first = previous.get("total_usage", cpu["total_usage"])
+        self.last = max(self.last, cpu["total_usage"])
+        return True
+
+    def sample(self):
+        """
+        Samples statistics until the tool is stopped.
+        """
+        if not self.measure():
+            return
+        while not self.done.wait(self.interval):
+            if not self.measure():
+                break
+
+    def stop(self):
+        """
+        Stops sampling, and returns the measures:
+        memory in bytes, CPU time and clock time in milliseconds.
+        """
+        self.end = time.monotonic()
+        self.done.set()
+        self.thread.join()
+        self.measure()
+        first = self.first if self.first is not None else self.last
+        return {
+            "Memory": self.memory,
+            "CPU Time": max(0, self.last - first) // 10**6,
+            "Clock Time": int((self.end - self.start) * 1000),
+        }
+
+
+def bytes_of(memory):
+    """
+    Converts a docker memory limit, such as 512m or 8g, to bytes,
+    or returns None if there is no limit.
+    """
+    if memory is None:
+        return None
+    search = re.search(r"^(\d+)([bkmg]?)$", memory.lower())
+    if search is None:
+        raise ValueError(f"Invalid memory limit {memory}.")
+    unit = "bkmg".index(search.group(2) or "b")
+    return int(search.group(1)) * 1024**unit
+
+
+def techniques_of(line):
+    """
+    Returns the techniques given in an output line of a tool.
+    """
+    search = re.search(r"\sTECHNIQUES\s+(.*)$", line)
+    if search is None:
+        return []
+    return search.group(1).split()
+
+
+def answers_of(lines):
+    """
+    Returns the answers and techniques in the output lines of a tool.
+    """
+    answers = {}
+    techniques = set()
+    for line in lines:
+        result = result_of(line)
+        if result is not None and result[0] not in answers:
+            answers[result[0]] = result[1]
+            techniques.update(techniques_of(line))
+    return answers, techniques
+
+
+def status_of(result, measures, confinement):
+    """
+    Returns the status of a tool run, from the result of its container.
+    """
+    if measures["Clock Time"] >= confinement * 1000:
+        return "timeout"
+    if result["StatusCode"] == 0:
+        return "normal"
+    return "failed"
+
+
+def results_of(answers):
+    """
+    Summarizes the answers of a tool as in the Results column,
+    where boolean answers are abbreviated.
+    """
+    values = [
+        value for value in answers.values()
+        if value not in UNANSWERED
+    ]
+    if not values:
+        if any(value == "DO_NOT_COMPETE" for value in answers.values()):
+            return "DNC"
+        if answers:
+            return "CC"
+        return "DNF"
+    if all(value in ["TRUE", "FALSE"] for value in values):
+        return "".join(value[0] for value in values)
+    return " ".join(values)
+
+
+class ResultsLog:
+    """
+    Local log of tool runs, in the results.csv format,
+    so that it can be given to the extract command.
+    Cores is the number of CPUs given to each tool,
+    and the memory limit of tools is in bytes.
+    """
+    def __init__(self, filename, cores=None, memory_limit=None):
+        self.filename = filename
+        self.cores = math.ceil(cores) if cores else os.cpu_count()
+        self.memory_limit = memory_limit
+        self.lock = threading.Lock()
+
+    def append(self, run, lines, result, measures):
+        """
+        Appends a tool run to the log, from the output lines
+        and the result of its container.
+        The run gives the tool, examination, instance and confinement.
+        """
+        confinement = run["Confinement"]
+        answers, techniques = answers_of(lines)
+        row = {
+            "Year": datetime.date.today().year,
+            "Tool": run["Tool"],
+            "Instance": run["Instance"],
+            "Examination": run["Examination"],
+            "Cores": self.cores,
+            "Time OK": measures["Clock Time"] < confinement * 1000,
+            "Memory OK": (
+                self.memory_limit is None
+                or measures["Memory"] < self.memory_limit
+            ),
+            "Results": results_of(answers),
+            "Techniques": " ".join(sorted(techniques)),
+            "Memory": measures["Memory"] // 2**20,
+            "CPU Time": measures["CPU Time"],
+            "Clock Time": measures["Clock Time"],
+            "IO Time": 0,
+            "Status": status_of(result, measures, confinement),
+        }
+        with self.lock:
+            exists = os.path.isfile(self.filename)
+            identifier = 1
+            if exists:
+                with open(self.filename, "r") as i:
+                    identifier = sum(1 for _ in i)
+            row["Id"] = identifier
+            with open(self.filename, "a", newline="") as output:
+                writer = csv.writer(output)
+                if not exists:
+                    writer.writerow(RESULTS)
+                writer.writerow([row[x] for x in RESULTS])